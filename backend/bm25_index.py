@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import math
+from array import array
+from collections import Counter
+import numpy as np
+from typing import List, Dict, Iterable, Optional, Tuple
+from chunk_store import replace_file
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Words, numbers and dose strings such as "0.25mg", "co-trimoxazole" or "5/325"
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+# Very common words carry almost no BM25 weight but have the longest posting lists;
+# "drug" and "section" head every FDA chunk ("Drug: ...\nSection: ...")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do drug for from has have how i if in is it may of on or "
+    "section should that the this to was what when which while will with".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased terms of `text`, without stopwords"""
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+
+class BM25Index:
+    """Okapi BM25 inverted index over chunk rows.
+
+    Rows are the same row numbers the FAISS index and chunk stores use. Each
+    term has a posting list of (row, term frequency) pairs; saved postings are
+    one CSR layout (rows and frequencies grouped by term id, plus offsets)
+    that is memory-mapped on load, and rows added afterwards are kept in
+    growable arrays until the next save, as `MetadataStore` does.
+    Document frequencies include tombstoned rows until the owning database
+    compacts; callers exclude those rows from results. Query terms found in
+    more than `max_df` of all rows are skipped unless every term is that
+    common: their idf is near zero, but scoring them means scanning most rows.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, max_df: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self.terms = {}  # term -> term id
+        self.total_length = 0
+
+        self._rows = None
+        self._tfs = None
+        self._offsets = None
+        self._lengths = None
+        self._appended = {}  # term id -> (rows, term frequencies)
+        self._appended_lengths = array('i')
+
+    @property
+    def mapped_rows(self) -> int:
+        return 0 if self._lengths is None else len(self._lengths)
+
+    def __len__(self) -> int:
+        return self.mapped_rows + len(self._appended_lengths)
+
+    def add(self, text: str):
+        """Index the next row"""
+        row = len(self)
+        terms = tokenize(text)
+        for term, tf in Counter(terms).items():
+            term_id = self.terms.setdefault(term, len(self.terms))
+            postings = self._appended.get(term_id)
+            if postings is None:
+                postings = self._appended[term_id] = (array('i'), array('H'))
+            postings[0].append(row)
+            postings[1].append(min(tf, 65535))
+        self._appended_lengths.append(len(terms))
+        self.total_length += len(terms)
+
+    def extend(self, texts: Iterable[str]):
+        for text in texts:
+            self.add(text)
+
+    def postings(self, term: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Rows containing `term` and the term's frequency in each"""
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return self._postings(term_id)
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        rows, tfs = [], []
+        if self._offsets is not None and term_id + 1 < len(self._offsets):
+            start, end = self._offsets[term_id], self._offsets[term_id + 1]
+            rows.append(self._rows[start:end])
+            tfs.append(self._tfs[start:end])
+        if term_id in self._appended:
+            appended_rows, appended_tfs = self._appended[term_id]
+            rows.append(np.frombuffer(appended_rows, dtype=np.int32))
+            tfs.append(np.frombuffer(appended_tfs, dtype=np.uint16))
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(rows).astype(np.int64), np.concatenate(tfs).astype(np.float32)
+
+    def document_frequency(self, term: str) -> int:
+        term_id = self.terms.get(term)
+        if term_id is None:
+            return 0
+        df = 0
+        if self._offsets is not None and term_id + 1 < len(self._offsets):
+            df += int(self._offsets[term_id + 1] - self._offsets[term_id])
+        if term_id in self._appended:
+            df += len(self._appended[term_id][0])
+        return df
+
+    def _lengths_at(self, rows: np.ndarray) -> np.ndarray:
+        lengths = np.empty(len(rows), dtype=np.float32)
+        mapped = rows < self.mapped_rows
+        if mapped.any():
+            lengths[mapped] = self._lengths[rows[mapped]]
+        if not mapped.all():
+            appended = np.frombuffer(self._appended_lengths, dtype=np.int32)
+            lengths[~mapped] = appended[rows[~mapped] - self.mapped_rows]
+        return lengths
+
+    def search(self, query: str, k: int, rows: Optional[np.ndarray] = None,
+               exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (scores, rows) for `query`, best first.
+
+        `rows` restricts hits to those rows and `exclude` drops rows (e.g.
+        tombstones). Only the posting lists of the query's terms are read.
+        """
+        n = len(self)
+        terms = set(tokenize(query))
+        if not terms or n == 0 or k <= 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        # Drop near-ubiquitous terms before reading their posting lists
+        selective = {term for term in terms if 0 < self.document_frequency(term) <= self.max_df * n}
+        if selective:
+            terms = selective
+
+        average_length = max(self.total_length / n, 1.0)
+        hit_rows, weights = [], []
+        for term in terms:
+            term_rows, tfs = self.postings(term)
+            if len(term_rows) == 0:
+                continue
+            df = len(term_rows)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._lengths_at(term_rows) / average_length)
+            hit_rows.append(term_rows)
+            weights.append(idf * tfs * (self.k1 + 1) / (tfs + norm))
+        if not hit_rows:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+
+        candidates, inverse = np.unique(np.concatenate(hit_rows), return_inverse=True)
+        scores = np.bincount(inverse.reshape(-1), weights=np.concatenate(weights))
+        keep = np.ones(len(candidates), dtype=bool)
+        if rows is not None:
+            keep &= np.isin(candidates, rows)
+        if exclude is not None and len(exclude):
+            keep &= ~np.isin(candidates, exclude)
+        candidates, scores = candidates[keep], scores[keep]
+
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.lexsort((candidates, -scores))
+        return scores[order].astype(np.float32), candidates[order]
+
+    def select(self, rows: np.ndarray) -> "BM25Index":
+        """A new in-memory index holding only `rows` (sorted), renumbered 0..len(rows)-1"""
+        index = BM25Index(self.k1, self.b, self.max_df)
+        renumber = np.full(len(self), -1, dtype=np.int64)
+        renumber[rows] = np.arange(len(rows))
+
+        for term, term_id in self.terms.items():
+            term_rows, tfs = self._postings(term_id)
+            kept = renumber[term_rows]
+            mask = kept >= 0
+            if not mask.any():
+                continue
+            new_id = index.terms.setdefault(term, len(index.terms))
+            index._appended[new_id] = (array('i', kept[mask].tolist()), array('H', tfs[mask].astype(np.uint16).tolist()))
+
+        lengths = self._lengths_at(np.asarray(rows, dtype=np.int64)).astype(np.int32)
+        index._appended_lengths = array('i', lengths.tolist())
+        index.total_length = int(lengths.sum())
+        return index
+
+    def save(self, path: str):
+        """Write `{path}.rows/.tfs/.offsets/.lengths.npy` (CSR postings) and `{path}.terms.json`"""
+        offsets = np.zeros(len(self.terms) + 1, dtype=np.int64)
+        rows, tfs = [], []
+        for term_id in range(len(self.terms)):
+            term_rows, term_tfs = self._postings(term_id)
+            rows.append(term_rows.astype(np.int32))
+            tfs.append(term_tfs.astype(np.uint16))
+            offsets[term_id + 1] = offsets[term_id] + len(term_rows)
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int32)
+        tfs = np.concatenate(tfs) if tfs else np.empty(0, dtype=np.uint16)
+        lengths = self._lengths_at(np.arange(len(self), dtype=np.int64)).astype(np.int32)
+
+        replace_file(f"{path}.rows.npy", lambda f: np.save(f, rows))
+        replace_file(f"{path}.tfs.npy", lambda f: np.save(f, tfs))
+        replace_file(f"{path}.offsets.npy", lambda f: np.save(f, offsets))
+        replace_file(f"{path}.lengths.npy", lambda f: np.save(f, lengths))
+
+        terms = sorted(self.terms, key=self.terms.get)
+        replace_file(f"{path}.terms.json", lambda f: f.write(json.dumps({
+            'k1': self.k1,
+            'b': self.b,
+            'total_length': self.total_length,
+            'terms': terms
+        }).encode('utf-8')))
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "BM25Index":
+        """Load postings written by `save`, memory-mapped unless `mmap` is False"""
+        with open(f"{path}.terms.json", 'r') as f:
+            info = json.load(f)
+        index = cls(info['k1'], info['b'])
+        index.terms = {term: term_id for term_id, term in enumerate(info['terms'])}
+        index.total_length = info['total_length']
+
+        mmap_mode = 'r' if mmap else None
+        index._rows = np.load(f"{path}.rows.npy", mmap_mode=mmap_mode)
+        index._tfs = np.load(f"{path}.tfs.npy", mmap_mode=mmap_mode)
+        index._offsets = np.load(f"{path}.offsets.npy", mmap_mode=mmap_mode)
+        index._lengths = np.load(f"{path}.lengths.npy", mmap_mode=mmap_mode)
+        return index
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(f"{path}.terms.json")
+
+    @classmethod
+    def from_texts(cls, texts: Iterable[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        index = cls(k1, b)
+        index.extend(texts)
+        return index
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    """Fuse ranked row lists into the top-k (rows, scores) by summed 1 / (rrf_k + rank)"""
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking.tolist()):
+            if row >= 0:
+                scores[row] = scores.get(row, 0.0) + 1.0 / (rrf_k + rank + 1)
+    fused = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+    return (
+        np.array([row for row, _ in fused], dtype=np.int64),
+        np.array([score for _, score in fused], dtype=np.float64)
+    )
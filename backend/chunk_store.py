@@ -0,0 +1,407 @@
+import os
+import json
+import mmap
+from array import array
+import numpy as np
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def replace_file(path: str, write):
+    """Write a file through a temporary name and atomically swap it in.
+
+    Readers that memory-mapped the previous version keep their (now unlinked)
+    inode, so rewriting a live store can never truncate pages under them.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+class RecordStore:
+    """Variable-length byte records addressed by row number.
+
+    On disk a store is a data file holding the concatenated records plus an
+    int64 offsets array (n + 1 entries). Loaded stores memory-map both files
+    and only decode the rows that are actually read, so several processes
+    serving the same store share its pages through the OS page cache.
+    Rows appended after loading are kept in memory until the next save.
+    """
+
+    def __init__(self):
+        self._data = None
+        self._offsets = None
+        self._appended = []
+
+    def _encode(self, value: Any) -> bytes:
+        return value
+
+    def _decode(self, raw: bytes) -> Any:
+        return raw
+
+    @property
+    def mapped_rows(self) -> int:
+        return 0 if self._offsets is None else len(self._offsets) - 1
+
+    def __len__(self) -> int:
+        return self.mapped_rows + len(self._appended)
+
+    def __getitem__(self, row: int) -> Any:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if row < self.mapped_rows:
+            start, end = self._offsets[row], self._offsets[row + 1]
+            return self._decode(self._data[start:end])
+        return self._appended[row - self.mapped_rows]
+
+    def __iter__(self) -> Iterator[Any]:
+        if self.mapped_rows:
+            offsets = self._offsets.tolist()
+            for start, end in zip(offsets, offsets[1:]):
+                yield self._decode(self._data[start:end])
+        yield from self._appended
+
+    def append(self, value: Any):
+        self._appended.append(value)
+
+    def extend(self, values: Iterable[Any]):
+        self._appended.extend(values)
+
+    def save(self, path: str):
+        """Write `{path}.data` and `{path}.offsets.npy`"""
+        offsets = np.zeros(len(self) + 1, dtype=np.int64)
+
+        def write_data(f):
+            for row in range(len(self)):
+                raw = self._raw(row)
+                f.write(raw)
+                offsets[row + 1] = offsets[row] + len(raw)
+
+        replace_file(f"{path}.data", write_data)
+        replace_file(f"{path}.offsets.npy", lambda f: np.save(f, offsets))
+
+    def _raw(self, row: int) -> bytes:
+        if row < self.mapped_rows:
+            return bytes(self._data[self._offsets[row]:self._offsets[row + 1]])
+        return self._encode(self._appended[row - self.mapped_rows])
+
+    @classmethod
+    def load(cls, path: str) -> "RecordStore":
+        """Memory-map a store written by `save`"""
+        store = cls()
+        store._offsets = np.load(f"{path}.offsets.npy", mmap_mode='r')
+        with open(f"{path}.data", 'rb') as f:
+            # mmap cannot map empty files
+            if os.fstat(f.fileno()).st_size > 0:
+                store._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                store._data = b''
+        return store
+
+    @classmethod
+    def from_values(cls, values: Iterable[Any]) -> "RecordStore":
+        store = cls()
+        store.extend(values)
+        return store
+
+class TextStore(RecordStore):
+    """Chunk texts stored as UTF-8 records"""
+
+    def _encode(self, value: str) -> bytes:
+        return value.encode('utf-8')
+
+    def _decode(self, raw: bytes) -> str:
+        return raw.decode('utf-8')
+
+class JSONStore(RecordStore):
+    """JSON-serialisable dicts stored as one compact JSON record per row"""
+
+    def _encode(self, value: Dict[str, Any]) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+    def _decode(self, raw: bytes) -> Dict[str, Any]:
+        return json.loads(raw)
+
+def document_id(document: Dict[str, Any]) -> str:
+    """Stable ID of a source document: its own `doc_id`, else source:drug_name:section"""
+    return document.get('doc_id') or f"{document.get('source', '')}:{document.get('drug_name', '')}:{document.get('section', '')}"
+
+class StringTable:
+    """Interns repeated strings as small integer codes"""
+
+    def __init__(self, values: Optional[List[str]] = None):
+        self.values = []
+        self.codes = {}
+        self.folded = {}  # lower-cased value -> codes, for case-insensitive lookups
+        for value in values or []:
+            self.intern(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+    def intern(self, value: str) -> int:
+        """Return the code for `value`, assigning a new one if it is unseen"""
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+            self.folded.setdefault(value.lower(), []).append(code)
+        return code
+
+    def get_code(self, value: str) -> Optional[int]:
+        return self.codes.get(value)
+
+    def find_codes(self, value: str) -> List[int]:
+        """Codes of every interned value equal to `value` ignoring case"""
+        return self.folded.get(value.lower(), [])
+
+class MetadataStore:
+    """Columnar chunk metadata.
+
+    drug_name/source/section/doc_id are interned into `StringTable`s and
+    stored as int32 code columns next to int32 chunk_id/total_chunks columns,
+    about 24 bytes per chunk instead of a dict each. Rows read back as plain
+    dicts. Deleted rows are tombstoned (kept, but excluded from lookups and
+    counts) until the owning database compacts.
+    Per-drug chunk counts are kept up to date on every append so stats never
+    need a scan, and each drug's rows are indexed (a CSR posting list on disk)
+    so drug-scoped searches never touch other drugs' rows. Saved columns are
+    memory-mapped on load; appended rows live in growable arrays until the
+    next save.
+    """
+
+    INTERNED = ('drug_name', 'source', 'section', 'doc_id')
+    COLUMNS = INTERNED + ('chunk_id', 'total_chunks')
+
+    def __init__(self):
+        self.tables = {name: StringTable() for name in self.INTERNED}
+        self._mapped = None
+        self._appended = {name: array('i') for name in self.COLUMNS}
+        self.drug_counts = []
+        self.unique_drugs = 0
+
+        # Rows per drug code: saved rows as CSR (rows sorted by drug + offsets), appended rows in arrays
+        self._drug_rows = None
+        self._drug_offsets = None
+        self._appended_drug_rows = {}
+
+        self.deleted = set()
+        self._deleted_rows = None  # sorted array cache of `deleted`
+
+    @property
+    def mapped_rows(self) -> int:
+        return 0 if self._mapped is None else len(self._mapped['chunk_id'])
+
+    def __len__(self) -> int:
+        return self.mapped_rows + len(self._appended['chunk_id'])
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if row < self.mapped_rows:
+            columns, position = self._mapped, row
+        else:
+            columns, position = self._appended, row - self.mapped_rows
+        values = {name: int(columns[name][position]) for name in self.COLUMNS}
+        for name in self.INTERNED:
+            values[name] = self.tables[name][values[name]]
+        return values
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for row in range(len(self)):
+            yield self[row]
+
+    @property
+    def live_count(self) -> int:
+        return len(self) - len(self.deleted)
+
+    def append(self, metadata: Dict[str, Any]):
+        metadata = dict(metadata, doc_id=document_id(metadata))
+        for name in self.INTERNED:
+            self._appended[name].append(self.tables[name].intern(metadata.get(name, '')))
+        self._appended['chunk_id'].append(metadata.get('chunk_id', 0))
+        self._appended['total_chunks'].append(metadata.get('total_chunks', 1))
+
+        drug = self._appended['drug_name'][-1]
+        self._appended_drug_rows.setdefault(drug, array('i')).append(len(self) - 1)
+        self._count_drug(drug, 1)
+
+    def extend(self, metadata: Iterable[Dict[str, Any]]):
+        for item in metadata:
+            self.append(item)
+
+    def delete_rows(self, rows: Iterable[int]) -> int:
+        """Tombstone rows, returning how many were newly deleted"""
+        rows = np.unique(np.fromiter(rows, dtype=np.int64))
+        if self.deleted:
+            rows = rows[~np.isin(rows, self.deleted_rows())]
+        if len(rows) == 0:
+            return 0
+
+        drugs, counts = np.unique(self._values_at('drug_name', rows), return_counts=True)
+        for drug, count in zip(drugs.tolist(), counts.tolist()):
+            self._count_drug(drug, -count)
+        self.deleted.update(rows.tolist())
+        self._deleted_rows = None
+        return len(rows)
+
+    def deleted_rows(self) -> np.ndarray:
+        if self._deleted_rows is None:
+            self._deleted_rows = np.array(sorted(self.deleted), dtype=np.int64)
+        return self._deleted_rows
+
+    def live_rows(self) -> np.ndarray:
+        """Sorted rows that are not tombstoned"""
+        rows = np.arange(len(self), dtype=np.int64)
+        if self.deleted:
+            rows = rows[~np.isin(rows, self.deleted_rows(), assume_unique=True)]
+        return rows
+
+    def _count_drug(self, code: int, delta: int):
+        """Maintain per-drug chunk counts and the number of drugs with any chunks"""
+        if code >= len(self.drug_counts):
+            self.drug_counts.extend([0] * (code + 1 - len(self.drug_counts)))
+        before = self.drug_counts[code]
+        self.drug_counts[code] = before + delta
+        if before == 0 and delta > 0:
+            self.unique_drugs += 1
+        elif before > 0 and before + delta == 0:
+            self.unique_drugs -= 1
+
+    def column(self, name: str) -> np.ndarray:
+        """A whole column as one int32 array (codes for interned fields)"""
+        # Copy, so a caller holding the result never pins the growable buffer
+        appended = np.frombuffer(self._appended[name], dtype=np.int32).copy()
+        if self._mapped is None:
+            return appended
+        if len(appended) == 0:
+            return self._mapped[name]
+        return np.concatenate([self._mapped[name], appended])
+
+    def rows_for_drugs(self, codes: Iterable[int]) -> np.ndarray:
+        """Sorted row numbers of every chunk belonging to the given drug codes"""
+        parts = []
+        for code in codes:
+            if self._drug_offsets is not None and code + 1 < len(self._drug_offsets):
+                parts.append(self._drug_rows[self._drug_offsets[code]:self._drug_offsets[code + 1]])
+            if code in self._appended_drug_rows:
+                parts.append(np.frombuffer(self._appended_drug_rows[code], dtype=np.int32))
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts).astype(np.int64))
+
+    def rows_matching(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted live rows whose interned fields match `filters` (case-insensitive).
+
+        Each filter value may be a string or a list of alternatives. A drug_name
+        filter is resolved through the per-drug row index; source and section
+        are then checked on just those rows.
+        """
+        codes = {}
+        for name, wanted in filters.items():
+            if name not in self.INTERNED:
+                raise ValueError(f"Cannot filter on '{name}', expected one of {self.INTERNED}")
+            values = [wanted] if isinstance(wanted, str) else list(wanted)
+            codes[name] = [code for value in values for code in self.tables[name].find_codes(value)]
+
+        if 'drug_name' in codes:
+            rows = self.rows_for_drugs(codes.pop('drug_name'))
+            if self.deleted:
+                rows = rows[~np.isin(rows, self.deleted_rows())]
+        else:
+            rows = self.live_rows()
+
+        for name, allowed in codes.items():
+            if len(rows) == 0:
+                break
+            column = self._values_at(name, rows)
+            rows = rows[np.isin(column, allowed)]
+        return rows
+
+    def _values_at(self, name: str, rows: np.ndarray) -> np.ndarray:
+        """Column values for a (small) set of rows without materialising the column"""
+        values = np.empty(len(rows), dtype=np.int32)
+        mapped = rows < self.mapped_rows
+        if mapped.any():
+            values[mapped] = self._mapped[name][rows[mapped]]
+        if not mapped.all():
+            appended = np.frombuffer(self._appended[name], dtype=np.int32)
+            values[~mapped] = appended[rows[~mapped] - self.mapped_rows]
+        return values
+
+    def save(self, path: str):
+        """Write one `{path}.<column>.npy` per column, the per-drug row index and `{path}.vocab.json`"""
+        for name in self.COLUMNS:
+            column = np.ascontiguousarray(self.column(name), dtype=np.int32)
+            replace_file(f"{path}.{name}.npy", lambda f: np.save(f, column))
+
+        drugs = self.column('drug_name')
+        drug_rows = np.argsort(drugs, kind='stable').astype(np.int32)
+        drug_offsets = np.zeros(len(self.tables['drug_name']) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(drugs, minlength=len(self.tables['drug_name'])), out=drug_offsets[1:])
+        replace_file(f"{path}.drug_rows.npy", lambda f: np.save(f, drug_rows))
+        replace_file(f"{path}.drug_offsets.npy", lambda f: np.save(f, drug_offsets))
+
+        deleted = self.deleted_rows()
+        replace_file(f"{path}.deleted.npy", lambda f: np.save(f, deleted))
+
+        vocab = {name: table.values for name, table in self.tables.items()}
+        vocab['drug_counts'] = self.drug_counts
+        replace_file(f"{path}.vocab.json", lambda f: f.write(json.dumps(vocab).encode('utf-8')))
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataStore":
+        """Memory-map the columns written by `save`"""
+        store = cls()
+        with open(f"{path}.vocab.json", 'r') as f:
+            vocab = json.load(f)
+        store.tables = {name: StringTable(vocab.get(name, [])) for name in cls.INTERNED}
+        store.drug_counts = vocab['drug_counts']
+        store.unique_drugs = sum(1 for count in store.drug_counts if count > 0)
+        store._mapped = {
+            name: np.load(f"{path}.{name}.npy", mmap_mode='r')
+            for name in cls.COLUMNS
+            if os.path.exists(f"{path}.{name}.npy")
+        }
+        if 'doc_id' not in store._mapped:
+            store._mapped['doc_id'] = store._derive_doc_ids()
+
+        if os.path.exists(f"{path}.deleted.npy"):
+            store.deleted = set(np.load(f"{path}.deleted.npy").tolist())
+
+        if os.path.exists(f"{path}.drug_rows.npy"):
+            store._drug_rows = np.load(f"{path}.drug_rows.npy", mmap_mode='r')
+            store._drug_offsets = np.load(f"{path}.drug_offsets.npy", mmap_mode='r')
+        else:
+            # Stores saved before the row index existed: build it once in memory
+            for row, drug in enumerate(store._mapped['drug_name'].tolist()):
+                store._appended_drug_rows.setdefault(drug, array('i')).append(row)
+        return store
+
+    def _derive_doc_ids(self) -> np.ndarray:
+        """Default doc_id codes for stores saved before documents had IDs"""
+        keys = np.stack([self._mapped[name] for name in ('source', 'drug_name', 'section')], axis=1)
+        combos, inverse = np.unique(keys, axis=0, return_inverse=True)
+        codes = np.array([
+            self.tables['doc_id'].intern(document_id({
+                'source': self.tables['source'][source],
+                'drug_name': self.tables['drug_name'][drug],
+                'section': self.tables['section'][section]
+            }))
+            for source, drug, section in combos.tolist()
+        ], dtype=np.int32)
+        return codes[inverse.reshape(-1)] if len(codes) else np.empty(0, dtype=np.int32)
+
+    @classmethod
+    def from_values(cls, values: Iterable[Dict[str, Any]]) -> "MetadataStore":
+        store = cls()
+        store.extend(values)
+        return store
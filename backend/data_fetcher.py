@@ -1,19 +1,221 @@
+import io
+import os
+import random
+import zipfile
 import requests
+from requests.adapters import HTTPAdapter
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import json
+from rate_limiter import TokenBucket
+from http_cache import HTTPCache
+from rxcui_table import RxCUITable
+from query_cache import LRUCache
+from streaming_json import iter_json_array
+from comprehensive_drug_database import COMPREHENSIVE_DRUG_DATABASE
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Published limits: openFDA allows 240 requests/minute per key or IP, RxNav 20 requests/second per IP
+FDA_REQUESTS_PER_MINUTE = 240
+RXNAV_REQUESTS_PER_SECOND = 20
+
+# Throttling and transient server errors are retried with jittered exponential backoff
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Seconds a cached response stays fresh, by endpoint: labels change weekly at most,
+# name -> RxCUI mappings and interaction data far less often
+CACHE_TTLS = {
+    'label.json': 86400,
+    'rxcui.json': 30 * 86400,
+    'interaction.json': 7 * 86400,
+    'list.json': 7 * 86400,
+}
+DEFAULT_CACHE_TTL = 86400
+
+COMMON_DRUGS = [
+    "ibuprofen", "acetaminophen", "amoxicillin", "metformin",
+    "lisinopril", "levothyroxine", "amlodipine", "metoprolol",
+    "omeprazole", "losartan", "gabapentin", "sertraline",
+    "simvastatin", "montelukast", "fluoxetine", "alprazolam",
+    "prednisone", "tramadol", "furosemide", "pantoprazole"
+]
+
+def label_drug_name(result: Dict[str, Any]) -> Optional[str]:
+    """Drug name of a raw openFDA label: its first generic name, else its first brand name"""
+    openfda = result.get('openfda', {})
+    names = openfda.get('generic_name') or openfda.get('brand_name') or []
+    return names[0].strip().lower() if names and names[0].strip() else None
+    
+def label_effective_date(result: Dict[str, Any]) -> Optional[str]:
+    """ISO date of a raw label's effective_time (YYYYMMDD), or None if missing or malformed"""
+    try:
+        return datetime.strptime(result.get('effective_time', ''), '%Y%m%d').date().isoformat()
+    except (TypeError, ValueError):
+        return None
+        
+def label_version(result: Dict[str, Any]) -> int:
+    """Numeric version of a raw label (openFDA sends it as a string), 0 if missing or malformed"""
+    try:
+        return int(result.get('version'))
+    except (TypeError, ValueError):
+        return 0
+        
+def index_interactions(data: Dict[str, Any], rxcui: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Index an RxNorm interaction.json response for `rxcui` by partner RxCUI.
+    
+    Partners are matched on the exact RxCUI of each interaction concept, and
+    a pair listed by several interaction types is recorded once.
+    """
+    index = {}
+    seen = set()
+    for group in data.get('interactionTypeGroup', []):
+        for interaction_type in group.get('interactionType', []):
+            for pair in interaction_type.get('interactionPair', []):
+                description = pair.get('description', '')
+                for concept in pair.get('interactionConcept', []):
+                    partner = str(concept.get('minConceptItem', {}).get('rxcui', ''))
+                    if not partner or partner == rxcui or (partner, description) in seen:
+                        continue
+                    seen.add((partner, description))
+                    index.setdefault(partner, []).append({
+                        'description': description,
+                        'severity': pair.get('severity', 'Unknown')
+                    })
+    return index
+    
+def index_regimen_interactions(data: Dict[str, Any], names_by_rxcui: Dict[str, List[str]]) -> List[Dict[str, Any]]:
+    """Interacting pairs from an RxNorm list.json response.
+    
+    Each `fullInteractionType` names the two queried RxCUIs in `minConcept`;
+    those are mapped back to the names the caller asked about.
+    """
+    pairs = []
+    seen = set()
+    for group in data.get('fullInteractionTypeGroup', []):
+        for interaction_type in group.get('fullInteractionType', []):
+            concepts = [str(concept.get('rxcui', '')) for concept in interaction_type.get('minConcept', [])]
+            if len(concepts) != 2 or not all(rxcui in names_by_rxcui for rxcui in concepts):
+                continue
+            rxcui1, rxcui2 = concepts
+            for pair in interaction_type.get('interactionPair', []):
+                description = pair.get('description', '')
+                key = (frozenset(concepts), description)
+                if key in seen:
+                    continue
+                seen.add(key)
+                pairs.append({
+                    'drug1': names_by_rxcui[rxcui1][0],
+                    'drug2': names_by_rxcui[rxcui2][0],
+                    'rxcui1': rxcui1,
+                    'rxcui2': rxcui2,
+                    'severity': pair.get('severity', 'Unknown'),
+                    'description': description
+                })
+    return pairs
+    
 class FDADataFetcher:
-    def __init__(self):
-        self.base_url = "https://api.fda.gov/drug"
-        self.rxnorm_base_url = "https://rxnav.nlm.nih.gov/REST"
+    def __init__(self, base_url: Optional[str] = None, rxnorm_base_url: Optional[str] = None,
+                 max_workers: int = 8, timeout: float = 10.0, max_retries: int = 4,
+                 backoff: float = 0.5, fda_requests_per_minute: Optional[float] = None,
+                 cache_path: Optional[str] = None, cache_ttls: Optional[Dict[str, float]] = None,
+                 rxcui_table_path: Optional[str] = None, interaction_cache_size: int = 512):
+        # Base URLs are injectable so the fetcher can run against a local stub server
+        self.base_url = base_url or os.getenv("FDA_BASE_URL", "https://api.fda.gov/drug")
+        self.rxnorm_base_url = rxnorm_base_url or os.getenv("RXNORM_BASE_URL", "https://rxnav.nlm.nih.gov/REST")
+        self.api_key = os.getenv("FDA_API_KEY") or None
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        
+        # One keep-alive connection pool sized for the worker threads
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        
+        rate = fda_requests_per_minute or float(os.getenv("FDA_REQUESTS_PER_MINUTE", FDA_REQUESTS_PER_MINUTE))
+        self.fda_limiter = TokenBucket.per_minute(rate, burst=max_workers)
+        self.rxnorm_limiter = TokenBucket(RXNAV_REQUESTS_PER_SECOND)
+        
+        # Responses are cached on disk only when a path is given
+        self.http_cache = HTTPCache(cache_path) if cache_path else None
+        self.cache_ttls = {**CACHE_TTLS, **(cache_ttls or {})}
         
+        # Name -> RxCUI resolutions, persisted when a path is given
+        self.rxcui_table = RxCUITable(rxcui_table_path)
+        self.interaction_indexes = LRUCache(interaction_cache_size, self.cache_ttls['interaction.json'])
+        
+    def _get(self, url: str, params: Dict[str, Any], limiter: TokenBucket, cached: bool = True,
+             deadline: Optional[float] = None):
+        """GET through the response cache when enabled, otherwise straight to the network"""
+        if self.http_cache is None or not cached:
+            return self._request(url, params, limiter, deadline=deadline)
+            
+        ttl = self.cache_ttls.get(url.rsplit('/', 1)[-1], DEFAULT_CACHE_TTL)
+        return self.http_cache.get(
+            url, params, ttl, lambda headers: self._request(url, params, limiter, headers, deadline)
+        )
+        
+    def _request(self, url: str, params: Dict[str, Any], limiter: TokenBucket,
+                 headers: Optional[Dict[str, str]] = None, deadline: Optional[float] = None) -> requests.Response:
+        """Rate-limited GET, retrying connection errors, 429s and 5xx with jittered backoff.
+        
+        Returns the final response (which may still be an error status once
+        retries are exhausted); raises if the last attempt could not connect.
+        With a `deadline` (a `time.monotonic()` value), waiting for the rate
+        limiter and each attempt's timeout are cut to the time left, and
+        `requests.Timeout` is raised instead of starting a retry that would
+        end after it.
+        """
+        for attempt in range(self.max_retries + 1):
+            if not limiter.acquire(deadline=deadline):
+                raise requests.Timeout(f"Deadline passed waiting to request {url}")
+            timeout = self.timeout
+            if deadline is not None:
+                timeout = min(timeout, deadline - time.monotonic())
+                if timeout <= 0:
+                    raise requests.Timeout(f"Deadline passed before requesting {url}")
+            last_attempt = attempt == self.max_retries
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                delay = self._backoff_delay(attempt)
+                if last_attempt:
+                    raise
+                if self._past(deadline, delay):
+                    raise requests.Timeout(f"Deadline passed retrying {url}: {str(e)}") from e
+                logger.warning(f"Request to {url} failed ({str(e)}), retrying in {delay:.2f}s")
+            else:
+                if response.status_code not in RETRY_STATUSES or last_attempt:
+                    return response
+                delay = self._retry_after(response) or self._backoff_delay(attempt)
+                if self._past(deadline, delay):
+                    return response
+                logger.warning(f"{url} returned {response.status_code}, retrying in {delay:.2f}s")
+            time.sleep(delay)
+            
+    @staticmethod
+    def _past(deadline: Optional[float], delay: float) -> bool:
+        """Whether waiting `delay` seconds would leave no time before `deadline`"""
+        return deadline is not None and time.monotonic() + delay >= deadline
+            
+    def _backoff_delay(self, attempt: int) -> float:
+        # "Full jitter": spreads retries of concurrent workers instead of synchronising them
+        return random.uniform(0, min(30.0, self.backoff * 2 ** attempt))
+        
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        try:
+            return min(60.0, float(response.headers.get('Retry-After', '')))
+        except ValueError:
+            return None
+            
     def search_drug_label(self, drug_name: str, limit: int = 10) -> List[Dict[str, Any]]:
         """Search FDA drug labels for a specific drug"""
         try:
@@ -22,8 +224,10 @@ class FDADataFetcher:
                 'search': f'openfda.brand_name:"{drug_name}" OR openfda.generic_name:"{drug_name}"',
                 'limit': limit
             }
-            
-            response = self.session.get(url, params=params)
+            if self.api_key:
+                params['api_key'] = self.api_key
+                
+            response = self._get(url, params, self.fda_limiter)
             
             if response.status_code == 200:
                 data = response.json()
@@ -69,19 +273,25 @@ class FDADataFetcher:
                 'generic_names': generic_names,
                 'sections': sections,
                 'source': 'FDA',
-                'last_updated': datetime.now().isoformat()
+                'set_id': result.get('set_id'),
+                'version': result.get('version'),
+                'effective_time': result.get('effective_time'),
+                'last_updated': label_effective_date(result) or datetime.now().isoformat()
             }
             
         except Exception as e:
             logger.error(f"Error processing label result: {str(e)}")
             return None
             
-    def get_drug_interactions(self, drug1: str, drug2: str) -> Dict[str, Any]:
-        """Check for interactions between two drugs using RxNorm"""
+    def get_drug_interactions(self, drug1: str, drug2: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Check for interactions between two drugs using RxNorm, giving up at `deadline` (see `_request`)"""
         try:
             # First, get RxCUI for both drugs
-            rxcui1 = self._get_rxcui(drug1)
-            rxcui2 = self._get_rxcui(drug2)
+            rxcuis = self.resolve_rxcuis([drug1, drug2], deadline=deadline)
+            failed = [name for name in (drug1, drug2) if name not in rxcuis]
+            if failed:
+                return self._rxnorm_failure(f"Could not look up {', '.join(failed)} in RxNorm", deadline)
+            rxcui1, rxcui2 = rxcuis[drug1], rxcuis[drug2]
             
             if not rxcui1 or not rxcui2:
                 return {
@@ -89,101 +299,292 @@ class FDADataFetcher:
                     'message': 'Could not find one or both drugs in RxNorm database'
                 }
                 
-            # Check for interactions
-            url = f"{self.rxnorm_base_url}/interaction/interaction.json"
-            params = {
-                'rxcui': rxcui1,
-                'sources': 'DrugBank'
+            # Interactions of the first drug, indexed by partner RxCUI
+            index = self.get_interaction_index(rxcui1, deadline=deadline)
+            if index is None:
+                return self._rxnorm_failure('Could not retrieve interactions from RxNorm', deadline)
+                
+            interactions = index.get(rxcui2, [])
+            return {
+                'status': 'success',
+                'drug1': drug1,
+                'drug2': drug2,
+                'interactions': interactions,
+                'interaction_found': len(interactions) > 0
+            }
+            
+        except requests.RequestException as e:
+            logger.error(f"Error checking drug interactions: {str(e)}")
+            return self._rxnorm_failure(str(e), deadline, e)
+        except Exception as e:
+            logger.error(f"Error checking drug interactions: {str(e)}")
+            return {
+                'status': 'error',
+                'message': str(e)
             }
             
-            response = self.session.get(url, params=params)
+    def get_regimen_interactions(self, drug_names: List[str], deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Check every pair in a multi-drug regimen with one RxNorm list query.
+        
+        All names are resolved in bulk first; names RxNorm does not know are
+        reported in 'unresolved' and left out of the check.
+        """
+        try:
+            drug_names = list(dict.fromkeys(drug_names))
+            rxcuis = self.resolve_rxcuis(drug_names, deadline=deadline)
+            # Every pair must be checked, so a regimen with a name that could not be looked up is not
+            failed = [name for name in drug_names if name not in rxcuis]
+            if failed:
+                return self._rxnorm_failure(f"Could not look up {', '.join(failed)} in RxNorm", deadline)
+            unresolved = [name for name in drug_names if not rxcuis.get(name)]
             
-            if response.status_code == 200:
-                data = response.json()
-                interactions = []
+            # Several names (e.g. brand and generic) can share an RxCUI
+            names_by_rxcui = {}
+            for name in drug_names:
+                if rxcuis.get(name):
+                    names_by_rxcui.setdefault(rxcuis[name], []).append(name)
+                    
+            result = {
+                'status': 'success',
+                'drugs': drug_names,
+                'rxcuis': {name: rxcuis[name] for name in drug_names if rxcuis.get(name)},
+                'unresolved': unresolved,
+                'interactions': [],
+                'interaction_found': False
+            }
+            if len(names_by_rxcui) < 2:
+                return result
                 
-                # Look for interactions with the second drug
-                interaction_groups = data.get('interactionTypeGroup', [])
-                for group in interaction_groups:
-                    for interaction_type in group.get('interactionType', []):
-                        for pair in interaction_type.get('interactionPair', []):
-                            concepts = pair.get('interactionConcept', [])
-                            for concept in concepts:
-                                if rxcui2 in str(concept.get('minConceptItem', {}).get('rxcui', '')):
-                                    interactions.append({
-                                        'description': pair.get('description', ''),
-                                        'severity': pair.get('severity', 'Unknown')
-                                    })
-                                    
-                return {
-                    'status': 'success',
-                    'drug1': drug1,
-                    'drug2': drug2,
-                    'interactions': interactions,
-                    'interaction_found': len(interactions) > 0
-                }
+            url = f"{self.rxnorm_base_url}/interaction/list.json"
+            params = {
+                'rxcuis': ' '.join(sorted(names_by_rxcui)),
+                'sources': 'DrugBank'
+            }
+            
+            response = self._get(url, params, self.rxnorm_limiter, deadline=deadline)
+            if response.status_code != 200:
+                return self._rxnorm_failure(f'RxNorm API error: {response.status_code}', deadline)
                 
+            result['interactions'] = index_regimen_interactions(response.json(), names_by_rxcui)
+            result['interaction_found'] = len(result['interactions']) > 0
+            return result
+            
+        except requests.RequestException as e:
+            logger.error(f"Error checking regimen interactions: {str(e)}")
+            return self._rxnorm_failure(str(e), deadline, e)
         except Exception as e:
-            logger.error(f"Error checking drug interactions: {str(e)}")
+            logger.error(f"Error checking regimen interactions: {str(e)}")
             return {
                 'status': 'error',
                 'message': str(e)
             }
             
+    @staticmethod
+    def _rxnorm_failure(message: str, deadline: Optional[float] = None,
+                        error: Optional[Exception] = None) -> Dict[str, Any]:
+        """Result for an RxNorm check that got no answer, as opposed to one that found nothing.
+        
+        'timeout' when the deadline cut it short, 'unavailable' when RxNorm
+        could not be reached or kept failing.
+        """
+        timed_out = isinstance(error, requests.Timeout) or (deadline is not None and time.monotonic() >= deadline)
+        return {
+            'status': 'timeout' if timed_out else 'unavailable',
+            'message': message
+        }
+        
+    def get_interaction_index(self, rxcui: str, deadline: Optional[float] = None) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Interactions of `rxcui` keyed by partner RxCUI, or None if RxNorm could not answer.
+        
+        Each response is parsed once and kept in memory, so checking one drug
+        against many partners costs a dictionary lookup per partner.
+        """
+        index = self.interaction_indexes.get(rxcui)
+        if index is not None:
+            return index
+            
+        url = f"{self.rxnorm_base_url}/interaction/interaction.json"
+        params = {
+            'rxcui': rxcui,
+            'sources': 'DrugBank'
+        }
+        
+        response = self._get(url, params, self.rxnorm_limiter, deadline=deadline)
+        if response.status_code != 200:
+            logger.error(f"RxNorm API error: {response.status_code}")
+            return None
+            
+        index = index_interactions(response.json(), rxcui)
+        self.interaction_indexes.put(rxcui, index)
+        return index
+        
     def _get_rxcui(self, drug_name: str) -> Optional[str]:
         """Get RxCUI identifier for a drug name"""
-        try:
-            url = f"{self.rxnorm_base_url}/rxcui.json"
-            params = {'name': drug_name}
-            
-            response = self.session.get(url, params=params)
+        return self.resolve_rxcuis([drug_name]).get(drug_name)
+        
+    def resolve_rxcuis(self, drug_names: List[str], deadline: Optional[float] = None) -> Dict[str, Optional[str]]:
+        """Resolve many drug or brand names to RxCUIs at once.
+        
+        Names come from the in-memory table; only names it has never seen
+        (or that RxNorm reported unknown long enough ago) go to the network,
+        concurrently. Names RxNorm does not know map to None; names whose
+        lookup failed (RxNorm unreachable, erroring or past `deadline`) are
+        left out, so callers can tell "unknown" from "not answered".
+        """
+        resolved, missing = self.rxcui_table.lookup_many(drug_names)
+        if not missing:
+            return resolved
             
-            if response.status_code == 200:
-                data = response.json()
-                id_group = data.get('idGroup', {})
-                rxnorm_id = id_group.get('rxnormId', [])
+        def lookup(name: str):
+            try:
+                return name, self._lookup_rxcui(name, deadline), True
+            except Exception as e:
+                logger.error(f"Error getting RxCUI for {name}: {str(e)}")
+                return name, None, False
                 
-                if rxnorm_id:
-                    return rxnorm_id[0]
-                    
-        except Exception as e:
-            logger.error(f"Error getting RxCUI: {str(e)}")
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+            lookups = list(pool.map(lookup, missing))
             
-        return None
+        # Failed requests are not recorded, so they are retried on the next call
+        found = {name: rxcui for name, rxcui, ok in lookups if ok}
+        self.rxcui_table.update(found)
+        self.rxcui_table.save()
+        
+        for name in drug_names:
+            key = self.rxcui_table.canonical(name)
+            if name not in resolved and key in found:
+                resolved[name] = found[key]
+        return resolved
+        
+    def _lookup_rxcui(self, drug_name: str, deadline: Optional[float] = None) -> Optional[str]:
+        """Query RxNorm for a drug name's RxCUI; raises if RxNorm could not answer"""
+        url = f"{self.rxnorm_base_url}/rxcui.json"
+        params = {'name': drug_name}
+        
+        response = self._get(url, params, self.rxnorm_limiter, deadline=deadline)
+        if response.status_code != 200:
+            raise RuntimeError(f"RxNorm API error: {response.status_code}")
+            
+        rxnorm_id = response.json().get('idGroup', {}).get('rxnormId', [])
+        return rxnorm_id[0] if rxnorm_id else None
+        
+    def seed_rxcui_table(self) -> int:
+        """Resolve every drug in the local drug database and the common-drug list; returns the table size"""
+        self.resolve_rxcuis(list(COMPREHENSIVE_DRUG_DATABASE) + COMMON_DRUGS)
+        return len(self.rxcui_table)
+        
+    def get_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Hit-rate metrics of the response cache, or None when caching is off"""
+        return self.http_cache.stats() if self.http_cache is not None else None
+        
+    def get_rxcui_stats(self) -> Dict[str, Any]:
+        return self.rxcui_table.stats()
         
     def fetch_common_drugs_data(self) -> List[Dict[str, Any]]:
         """Fetch data for a list of common drugs"""
-        common_drugs = [
-            "ibuprofen", "acetaminophen", "amoxicillin", "metformin",
-            "lisinopril", "levothyroxine", "amlodipine", "metoprolol",
-            "omeprazole", "losartan", "gabapentin", "sertraline",
-            "simvastatin", "montelukast", "fluoxetine", "alprazolam",
-            "prednisone", "tramadol", "furosemide", "pantoprazole"
-        ]
-        
-        all_results = []
-        
-        for drug in common_drugs:
-            logger.info(f"Fetching data for {drug}...")
-            results = self.search_drug_label(drug, limit=1)
-            if results:
-                all_results.extend(results)
-            time.sleep(0.5)  # Rate limiting
+        return self.fetch_drug_labels(COMMON_DRUGS, limit=1)
+        
+    def fetch_drug_labels(self, drug_names: List[str], limit: int = 1) -> List[Dict[str, Any]]:
+        """Fetch labels for many drugs concurrently, keeping the order of `drug_names`.
+        
+        Up to `max_workers` requests run at once over pooled connections; the
+        token bucket keeps the overall rate within openFDA's limit.
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            per_drug = list(pool.map(lambda drug: self.search_drug_label(drug, limit=limit), drug_names))
             
+        all_results = [result for results in per_drug for result in results]
+        logger.info(
+            f"Fetched {len(all_results)} labels for {len(drug_names)} drugs "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
         return all_results
         
+    def fetch_labels_by_set_id(self, set_ids: List[str], since: Optional[str] = None,
+                               batch_size: int = 50) -> List[Dict[str, Any]]:
+        """Current raw labels for `set_ids`, only those effective on or after `since` (YYYYMMDD) if given.
+        
+        Set IDs are queried `batch_size` at a time, concurrently, bypassing
+        the response cache so a refresh always sees the latest versions.
+        """
+        url = f"{self.base_url}/label.json"
+        
+        def fetch(batch: List[str]) -> List[Dict[str, Any]]:
+            search = ' OR '.join(f'set_id:"{set_id}"' for set_id in batch)
+            if since:
+                search = f'({search}) AND effective_time:[{since} TO 99991231]'
+            params = {'search': search, 'limit': len(batch)}
+            if self.api_key:
+                params['api_key'] = self.api_key
+                
+            response = self._get(url, params, self.fda_limiter, cached=False)
+            # openFDA answers 404 when nothing matches
+            if response.status_code == 404:
+                return []
+            if response.status_code != 200:
+                raise RuntimeError(f"FDA API error: {response.status_code}")
+            return response.json().get('results', [])
+            
+        batches = [set_ids[begin:begin + batch_size] for begin in range(0, len(set_ids), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return [result for results in pool.map(fetch, batches) for result in results]
+            
+    def iter_bulk_labels(self, zip_path: str, known_versions: Optional[Dict[str, int]] = None) -> Iterator[Dict[str, Any]]:
+        """Stream processed labels out of an openFDA bulk download (drug-label-*.json.zip).
+        
+        Each JSON member is decompressed and parsed incrementally, one label
+        at a time, so memory stays bounded by the largest label rather than
+        the dump. Labels without an openfda generic or brand name are skipped.
+        
+        With `known_versions` (set_id -> version), labels no newer than the
+        recorded version are skipped and the mapping is updated as labels are
+        yielded, so only the latest version of each set_id gets through.
+        """
+        processed_count = 0
+        skipped = 0
+        unchanged = 0
+        with zipfile.ZipFile(zip_path) as archive:
+            for member in archive.namelist():
+                if not member.endswith('.json'):
+                    continue
+                with archive.open(member) as raw:
+                    for result in iter_json_array(io.TextIOWrapper(raw, encoding='utf-8'), path=('results',)):
+                        set_id, version = result.get('set_id'), label_version(result)
+                        if known_versions is not None and set_id and version <= known_versions.get(set_id, -1):
+                            unchanged += 1
+                            continue
+                        drug_name = label_drug_name(result)
+                        processed = self._process_label_result(result, drug_name) if drug_name else None
+                        if processed is None:
+                            skipped += 1
+                            continue
+                        # Kept apart from the per-drug API labels, which are replaced drug by drug
+                        processed['source'] = 'FDA Bulk'
+                        if known_versions is not None and set_id:
+                            known_versions[set_id] = version
+                        processed_count += 1
+                        yield processed
+                        
+        logger.info(f"Read {processed_count} labels from {zip_path} ({skipped} skipped, {unchanged} unchanged)")
+        
     def create_document_for_vectordb(self, drug_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Convert FDA drug data into documents for vector database"""
         documents = []
         drug_name = drug_data['drug_name']
+        source = drug_data.get('source', 'FDA')
         
         for section_name, content in drug_data['sections'].items():
             if content and len(content) > 50:  # Skip empty or very short sections
-                documents.append({
+                document = {
                     'drug_name': drug_name,
                     'content': f"Drug: {drug_name}\nSection: {section_name.replace('_', ' ').title()}\n\n{content}",
-                    'source': 'FDA',
+                    'source': source,
                     'section': section_name
-                })
+                }
+                if drug_data.get('set_id'):
+                    # One ID per label, so replacing it also drops sections a newer version no longer has
+                    document['doc_id'] = f"{source}:{drug_data['set_id']}"
+                documents.append(document)
                 
         return documents
\ No newline at end of file
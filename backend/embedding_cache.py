@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+from typing import List, Dict, Any
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def text_hash(text: str) -> bytes:
+    """Content address of a chunk text"""
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+class EmbeddingCache:
+    """Persistent map from (model, chunk text hash) to embedding, stored in SQLite.
+
+    Vectors are kept as raw float32 bytes. The model key separates vectors
+    of different models (or backends that do not reproduce each other's
+    outputs), so switching models never reuses stale embeddings.
+    """
+
+    # Stay below SQLite's default limit on bound parameters
+    LOOKUP_BATCH = 500
+
+    def __init__(self, path: str, model: str):
+        self.path = path
+        self.model = model
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Parallel index builds share one cache file across worker processes
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, hash BLOB NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, hash)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def get_many(self, hashes: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Cached vectors for whichever of `hashes` are present"""
+        found = {}
+        with self._lock:
+            for begin in range(0, len(hashes), self.LOOKUP_BATCH):
+                batch = hashes[begin:begin + self.LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [self.model, *batch]
+                )
+                for digest, vector in rows:
+                    found[digest] = np.frombuffer(vector, dtype=np.float32)
+            self.hits += len(found)
+            self.misses += len(hashes) - len(found)
+        return found
+
+    def put_many(self, hashes: List[bytes], vectors: np.ndarray):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, hash, vector) VALUES (?, ?, ?)",
+                [
+                    (self.model, digest, np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+                    for digest, vector in zip(hashes, vectors)
+                ]
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'model': self.model,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
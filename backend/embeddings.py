@@ -0,0 +1,183 @@
+import os
+import time
+import threading
+import numpy as np
+from typing import List, Optional
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ('sentence-transformers', 'onnx')
+
+def _default_threads() -> Optional[int]:
+    """Intra-op threads per process from EMBEDDING_THREADS (unset lets the runtime decide)"""
+    threads = os.getenv("EMBEDDING_THREADS")
+    return int(threads) if threads else None
+
+class SentenceTransformerBackend:
+    """The sentence-transformers (PyTorch) encoder, loaded on first use"""
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", num_threads: Optional[int] = None):
+        self.model_name = model_name
+        self.num_threads = num_threads
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies the vectors this backend produces, for persistent embedding caches"""
+        return self.model_name
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                    if self.num_threads:
+                        torch.set_num_threads(self.num_threads)
+                    self._model = SentenceTransformer(self.model_name)
+                    logger.info(f"Loaded {self.model_name} (sentence-transformers) in {time.perf_counter() - start:.2f}s")
+        return self._model
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+
+class OnnxEmbeddingBackend:
+    """ONNX Runtime encoder for an exported sentence-transformers model.
+
+    Reproduces the all-MiniLM-L6-v2 pipeline (token embeddings, attention-masked
+    mean pooling, L2 normalisation), so its vectors are interchangeable with
+    `SentenceTransformerBackend`'s and existing indexes stay valid. With
+    `quantized`, the int8 dynamically quantized export is used. The session is
+    created on first use.
+    """
+
+    def __init__(self, model_dir: str, quantized: bool = True, num_threads: Optional[int] = None,
+                 max_length: int = 256, model_name: str = "all-MiniLM-L6-v2"):
+        self.model_dir = model_dir
+        self.quantized = quantized
+        self.num_threads = num_threads
+        self.max_length = max_length
+        self.model_name = model_name
+        self._session = None
+        self._tokenizer = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_key(self) -> str:
+        # Compatible with, but not bit-identical to, the sentence-transformers vectors
+        return f"{self.model_name}:onnx{'-int8' if self.quantized else ''}"
+
+    @property
+    def model_path(self) -> str:
+        return os.path.join(self.model_dir, "model_int8.onnx" if self.quantized else "model.onnx")
+
+    def _load(self):
+        with self._lock:
+            if self._session is not None:
+                return
+            try:
+                import onnxruntime as ort
+                from transformers import AutoTokenizer
+            except ImportError as e:
+                raise ImportError("The onnx embedding backend needs onnxruntime and transformers installed") from e
+
+            start = time.perf_counter()
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if self.num_threads:
+                # One pool per worker process; several uvicorn workers must not oversubscribe the cores
+                options.intra_op_num_threads = self.num_threads
+                options.inter_op_num_threads = 1
+            self._tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+            self._session = ort.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+            self._input_names = {i.name for i in self._session.get_inputs()}
+            logger.info(f"Loaded {self.model_path} (onnxruntime) in {time.perf_counter() - start:.2f}s")
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if self._session is None:
+            self._load()
+
+        batches = []
+        for begin in range(0, len(texts), batch_size):
+            tokens = self._tokenizer(
+                texts[begin:begin + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors='np'
+            )
+            inputs = {name: tokens[name].astype(np.int64) for name in self._input_names if name in tokens}
+            token_embeddings = self._session.run(None, inputs)[0]
+
+            # Mean pooling over real tokens, then L2 normalisation
+            mask = tokens['attention_mask'][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None))
+
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(batches).astype(np.float32)
+
+def export_onnx_model(model_name: str = "all-MiniLM-L6-v2", output_dir: str = "./data/onnx/all-MiniLM-L6-v2",
+                      quantize: bool = True) -> str:
+    """Export a sentence-transformers model's transformer to ONNX (plus an int8 copy) with its tokenizer"""
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+    model = SentenceTransformer(model_name, device='cpu')
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["export sample"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['token_embeddings'] = {0: 'batch', 1: 'sequence'}
+
+    model_path = os.path.join(output_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            tuple(sample[name] for name in input_names),
+            model_path,
+            input_names=input_names,
+            output_names=['token_embeddings'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    logger.info(f"Exported {model_name} to {model_path}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(model_path, os.path.join(output_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+        logger.info(f"Wrote int8 dynamically quantized model to {output_dir}")
+
+    return output_dir
+
+def create_embedding_backend(backend: Optional[str] = None, model_name: str = "all-MiniLM-L6-v2",
+                             num_threads: Optional[int] = None):
+    """Build the embedding backend named by `backend` or the EMBEDDING_BACKEND env var"""
+    backend = backend or os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+    num_threads = num_threads or _default_threads()
+
+    if backend == 'sentence-transformers':
+        return SentenceTransformerBackend(model_name, num_threads=num_threads)
+    if backend == 'onnx':
+        return OnnxEmbeddingBackend(
+            os.getenv("ONNX_MODEL_DIR", f"./data/onnx/{model_name}"),
+            quantized=os.getenv("ONNX_QUANTIZED", "true").lower() == "true",
+            num_threads=num_threads,
+            model_name=model_name
+        )
+    raise ValueError(f"Unknown embedding backend '{backend}', expected one of {EMBEDDING_BACKENDS}")
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, Callable
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Successful lookups and openFDA's "no matches" 404 are worth remembering; other errors are not
+CACHEABLE_STATUSES = frozenset({200, 404})
+
+# Query parameters that identify the caller rather than the resource
+UNKEYED_PARAMS = frozenset({'api_key'})
+
+class CachedResponse:
+    """The parts of an HTTP response the fetchers use, as stored in the cache"""
+
+    def __init__(self, status_code: int, content: bytes, headers: Dict[str, str], from_cache: bool = False):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+        self.from_cache = from_cache
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+class HTTPCache:
+    """Persistent GET response cache stored in SQLite.
+
+    Fresh entries are served directly. Entries past their TTL but within
+    `stale_while_revalidate` seconds are served immediately while a
+    background conditional request (ETag / Last-Modified) refreshes them;
+    older entries are revalidated before returning. If revalidation fails,
+    the stored response is served rather than the error.
+
+    The entry count is counted once on open and then kept up to date by this
+    process, so entries written by other processes sharing the file are not
+    reflected until it is reopened.
+    """
+
+    def __init__(self, path: str, stale_while_revalidate: float = 86400.0, revalidate_workers: int = 2):
+        self.path = path
+        self.stale_while_revalidate = stale_while_revalidate
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.stale_errors = 0
+        self._lock = threading.Lock()
+        self._inflight = set()
+        self._executor = ThreadPoolExecutor(max_workers=revalidate_workers, thread_name_prefix="http-cache")
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key BLOB PRIMARY KEY, url TEXT NOT NULL, status INTEGER NOT NULL, "
+            "headers TEXT NOT NULL, body BLOB NOT NULL, expires_at REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict[str, Any]] = None) -> bytes:
+        """Cache key of a GET, independent of parameter order and API keys"""
+        items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in UNKEYED_PARAMS)
+        return hashlib.sha256(json.dumps([url, items]).encode('utf-8')).digest()
+
+    def get(self, url: str, params: Optional[Dict[str, Any]], ttl: float,
+            fetch: Callable[[Dict[str, str]], Any]) -> Any:
+        """Response for a GET of `url` with `params`, going through `fetch` only when needed.
+
+        `fetch(headers)` performs the request with the given extra headers
+        and returns a `requests.Response`-like object.
+        """
+        key = self.key(url, params)
+        entry = self._load(key)
+        now = time.time()
+
+        if entry is not None:
+            response, expires_at = entry
+            if now < expires_at:
+                self._count('hits')
+                return response
+            if now < expires_at + self.stale_while_revalidate:
+                self._count('stale_hits')
+                self._revalidate_in_background(key, url, response, ttl, fetch)
+                return response
+
+        self._count('misses')
+        return self._refresh(key, url, entry[0] if entry else None, ttl, fetch)
+
+    def _refresh(self, key: bytes, url: str, stored: Optional[CachedResponse], ttl: float,
+                 fetch: Callable[[Dict[str, str]], Any]) -> Any:
+        headers = {}
+        if stored is not None:
+            if stored.headers.get('etag'):
+                headers['If-None-Match'] = stored.headers['etag']
+            if stored.headers.get('last-modified'):
+                headers['If-Modified-Since'] = stored.headers['last-modified']
+
+        try:
+            response = fetch(headers)
+        except Exception:
+            if stored is None:
+                raise
+            self._count('stale_errors')
+            logger.warning(f"Revalidating {url} failed, serving cached response")
+            return stored
+
+        if response.status_code == 304 and stored is not None:
+            self._count('revalidated')
+            self._touch(key, ttl)
+            return stored
+        if response.status_code in CACHEABLE_STATUSES:
+            cached = CachedResponse(
+                response.status_code,
+                response.content,
+                {name: response.headers[name] for name in ('etag', 'last-modified') if name in response.headers}
+            )
+            self._store(key, url, cached, ttl)
+            return cached
+        if stored is not None:
+            self._count('stale_errors')
+            logger.warning(f"{url} returned {response.status_code}, serving cached response")
+            return stored
+        return response
+
+    def _revalidate_in_background(self, key: bytes, url: str, stored: CachedResponse, ttl: float,
+                                  fetch: Callable[[Dict[str, str]], Any]):
+        with self._lock:
+            if key in self._inflight:
+                return
+            self._inflight.add(key)
+
+        def revalidate():
+            try:
+                self._refresh(key, url, stored, ttl, fetch)
+            except Exception as e:
+                logger.error(f"Background revalidation of {url} failed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._inflight.discard(key)
+
+        self._executor.submit(revalidate)
+
+    def _load(self, key: bytes):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, expires_at = row
+        return CachedResponse(status, body, json.loads(headers), from_cache=True), expires_at
+
+    def _store(self, key: bytes, url: str, response: CachedResponse, ttl: float):
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, status, headers, body, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, response.status_code, json.dumps(response.headers), response.content, time.time() + ttl)
+            )
+            self._conn.commit()
+            if exists is None:
+                self._entries += 1
+
+    def _touch(self, key: bytes, ttl: float):
+        with self._lock:
+            self._conn.execute("UPDATE responses SET expires_at = ? WHERE key = ?", (time.time() + ttl, key))
+            self._conn.commit()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._entries = 0
+
+    def __len__(self) -> int:
+        return self._entries
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            self._conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            'path': self.path,
+            'entries': len(self),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'revalidated': self.revalidated,
+            'stale_errors': self.stale_errors,
+            'hit_rate': (self.hits + self.stale_hits) / lookups if lookups else 0.0
+        }
@@ -0,0 +1,192 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import numpy as np
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+from vector_db import MedicineVectorDB
+from embeddings import create_embedding_backend
+from chunk_store import replace_file
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Settings that only matter to the workers' chunking and embedding
+WORKER_SETTINGS = ('embedding_model_name', 'batch_size', 'embedding_cache_path')
+
+_worker_db = None
+
+def _init_worker(settings: Dict[str, Any], backend: Optional[str], threads: Optional[int]):
+    """Give each worker process its own (lazily loaded) embedding model"""
+    global _worker_db
+    model_name = settings.get('embedding_model_name', "all-MiniLM-L6-v2")
+    _worker_db = MedicineVectorDB(
+        embedding_backend=create_embedding_backend(backend, model_name=model_name, num_threads=threads),
+        **settings
+    )
+
+def _embed_shard(shard_id: int, documents: List[Dict[str, Any]], digest: str, shard_path: str) -> Tuple[int, int, int]:
+    """Chunk and embed one shard, checkpointing it as `{shard_path}.npy` + `{shard_path}.json`"""
+    chunks, metadata = _worker_db._chunk_documents(documents)
+    if chunks:
+        embeddings, embedded = _worker_db._encode_chunks(chunks)
+    else:
+        embeddings, embedded = np.empty((0, _worker_db.dimension), dtype=np.float32), 0
+
+    # The JSON file is written last: its presence marks the shard complete
+    replace_file(f"{shard_path}.npy", lambda f: np.save(f, embeddings))
+    replace_file(f"{shard_path}.json", lambda f: f.write(json.dumps({
+        'digest': digest,
+        'chunks': chunks,
+        'metadata': metadata
+    }).encode('utf-8')))
+    return shard_id, len(chunks), embedded
+
+def documents_digest(documents: List[Dict[str, Any]]) -> str:
+    return hashlib.sha256(json.dumps(documents, sort_keys=True).encode('utf-8')).hexdigest()
+
+class ParallelIndexBuilder:
+    """Offline vector database build that shards chunking and embedding across processes.
+
+    The document stream is cut into fixed-size shards, numbered in stream
+    order, and each shard is chunked and embedded by a worker process and
+    checkpointed to `checkpoint_dir`. Shards are then merged into one FAISS
+    index, chunk store and metadata store strictly in shard order, so the
+    result does not depend on which worker finished first. Re-running an
+    interrupted build with the same settings and documents reuses every
+    completed shard. Remaining keyword arguments configure the
+    `MedicineVectorDB` that is built.
+    """
+
+    def __init__(self, output_path: str, workers: Optional[int] = None, shard_size: int = 256,
+                 checkpoint_dir: Optional[str] = None, embedding_backend: Optional[str] = None,
+                 threads_per_worker: Optional[int] = None, **db_kwargs):
+        self.output_path = output_path
+        self.workers = workers if workers is not None else max(1, (os.cpu_count() or 1) - 1)
+        self.shard_size = shard_size
+        self.checkpoint_dir = checkpoint_dir or f"{output_path}.build"
+        self.embedding_backend = embedding_backend
+        # Split the cores between workers instead of letting every worker use all of them
+        self.threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // max(self.workers, 1))
+        self.db_kwargs = db_kwargs
+
+    def _shard_path(self, shard_id: int) -> str:
+        return os.path.join(self.checkpoint_dir, f"shard-{shard_id:06d}")
+
+    def _shards(self, documents: Iterable[Dict[str, Any]]) -> Iterator[Tuple[int, List[Dict[str, Any]]]]:
+        iterator = iter(documents)
+        for shard_id in itertools.count():
+            shard = list(itertools.islice(iterator, self.shard_size))
+            if not shard:
+                return
+            yield shard_id, shard
+
+    def _completed(self, shard_id: int, digest: str) -> bool:
+        """Whether the shard was checkpointed from identical documents"""
+        path = f"{self._shard_path(shard_id)}.json"
+        if not os.path.exists(path):
+            return False
+        with open(path, 'r') as f:
+            return json.load(f)['digest'] == digest
+
+    def _prepare_checkpoint(self, resume: bool):
+        """Start a fresh checkpoint directory unless resuming a build with the same settings"""
+        settings = {
+            'shard_size': self.shard_size,
+            'embedding_backend': self.embedding_backend or os.getenv("EMBEDDING_BACKEND", "sentence-transformers"),
+            'db_kwargs': self.db_kwargs
+        }
+        manifest_path = os.path.join(self.checkpoint_dir, "manifest.json")
+        if resume and os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                if json.load(f) == settings:
+                    return
+            logger.info("Build settings changed, discarding checkpoints")
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        replace_file(manifest_path, lambda f: f.write(json.dumps(settings).encode('utf-8')))
+
+    def build(self, documents: Iterable[Dict[str, Any]], resume: bool = True,
+              keep_checkpoints: bool = False) -> Dict[str, Any]:
+        """Build and save the database at `output_path`, returning build statistics"""
+        self._prepare_checkpoint(resume)
+        worker_settings = {key: self.db_kwargs[key] for key in WORKER_SETTINGS if key in self.db_kwargs}
+
+        start = time.perf_counter()
+        stats = {'shards': 0, 'resumed_shards': 0, 'documents': 0, 'chunks': 0, 'embedded_chunks': 0}
+
+        def record(shard_id: int, chunks: int, embedded: int):
+            stats['chunks'] += chunks
+            stats['embedded_chunks'] += embedded
+            done = stats['shards'] + stats['resumed_shards']
+            elapsed = time.perf_counter() - start
+            logger.info(
+                f"Shard {shard_id} done ({done} shards, {stats['documents']} documents, {stats['chunks']} chunks, "
+                f"{stats['chunks'] / elapsed if elapsed > 0 else 0.0:.1f} chunks/sec)"
+            )
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(worker_settings, self.embedding_backend, self.threads_per_worker)
+        ) as pool:
+            running = set()
+            total_shards = 0
+            for shard_id, shard in self._shards(documents):
+                total_shards += 1
+                stats['documents'] += len(shard)
+                digest = documents_digest(shard)
+                if self._completed(shard_id, digest):
+                    stats['resumed_shards'] += 1
+                    continue
+
+                # Keep only a few shards in flight so the document stream is never fully materialised
+                if len(running) >= self.workers * 2:
+                    finished, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        stats['shards'] += 1
+                        record(*future.result())
+                running.add(pool.submit(_embed_shard, shard_id, shard, digest, self._shard_path(shard_id)))
+
+            for future in wait(running).done:
+                stats['shards'] += 1
+                record(*future.result())
+
+        embed_seconds = time.perf_counter() - start
+        logger.info(
+            f"Embedded {total_shards} shards ({stats['resumed_shards']} resumed from checkpoints) "
+            f"in {embed_seconds:.2f}s; merging"
+        )
+
+        db = self._merge(total_shards)
+        db.save(self.output_path)
+        if not keep_checkpoints:
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+        stats['seconds'] = time.perf_counter() - start
+        stats['embed_seconds'] = embed_seconds
+        stats['chunks_per_sec'] = stats['chunks'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        logger.info(f"Built vector database at {self.output_path} in {stats['seconds']:.2f}s: {stats}")
+        return stats
+
+    def _merge(self, total_shards: int) -> MedicineVectorDB:
+        """Add every checkpointed shard to one database, in shard order"""
+        db = MedicineVectorDB(**self.db_kwargs)
+
+        def shards():
+            for shard_id in range(total_shards):
+                path = self._shard_path(shard_id)
+                with open(f"{path}.json", 'r') as f:
+                    shard = json.load(f)
+                if shard['chunks']:
+                    yield np.load(f"{path}.npy"), shard['chunks'], shard['metadata']
+
+        db._add_batches(shards())
+        return db
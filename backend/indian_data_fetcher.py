@@ -1,13 +1,50 @@
 import requests
 import pandas as pd
+import re
 import json
+import itertools
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime
+from streaming_json import iter_json_array
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Fields kept from the Kaggle dump
+KAGGLE_COLUMNS = ('name', 'manufacturer', 'composition', 'uses', 'side_effects', 'price')
+
+# The first number in a price string; currency marks such as "Rs." and "₹" are skipped
+_PRICE = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+def _normalise_frame(df: pd.DataFrame, fields: tuple) -> pd.DataFrame:
+    """Select `fields` (adding missing ones), blank out nulls, strip text and parse prices.
+    
+    Prices such as "₹1,250.50" become floats; missing or unparseable prices
+    become '' so they are left out of documents.
+    """
+    df = df.reindex(columns=list(fields))
+    text = [field for field in fields if field != 'price']
+    df[text] = df[text].fillna('').astype(str).apply(lambda column: column.str.strip())
+    
+    if 'price' in df:
+        prices = df['price']
+        if not pd.api.types.is_numeric_dtype(prices):
+            prices = prices.astype(str).str.extract(f'({_PRICE.pattern})', expand=False).str.replace(',', '', regex=False)
+        prices = pd.to_numeric(prices, errors='coerce')
+        df['price'] = prices.astype(object).where(prices.notna(), '')
+    return df
+
+def _clean_text(value: Any) -> str:
+    return '' if value is None else str(value).strip()
+
+def _clean_price(value: Any) -> Any:
+    """Scalar counterpart of the price handling in `_normalise_frame`"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value if value == value else ''
+    match = _PRICE.search('' if value is None else str(value))
+    return float(match.group().replace(',', '')) if match else ''
+
 class IndianMedicineDataFetcher:
     """Fetcher for Indian medicine data from various sources"""
     
@@ -65,22 +102,10 @@ class IndianMedicineDataFetcher:
         Dataset: https://www.kaggle.com/datasets/mohneesh7/indian-medicine-data
         """
         try:
-            # Load CSV file
-            df = pd.read_csv(file_path)
-            
-            # Convert to list of dictionaries
-            medicines = []
-            for _, row in df.iterrows():
-                medicines.append({
-                    'name': row.get('name', ''),
-                    'manufacturer': row.get('manufacturer', ''),
-                    'composition': row.get('composition', ''),
-                    'uses': row.get('uses', ''),
-                    'side_effects': row.get('side_effects', ''),
-                    'price': row.get('price', ''),
-                    'source': 'Kaggle Indian Medicine Dataset'
-                })
-                
+            # Only the needed columns, all read as strings; normalised column-wise below
+            df = pd.read_csv(file_path, usecols=lambda c: c in KAGGLE_COLUMNS, dtype=str)
+            medicines = self._kaggle_records(df)
+            
             logger.info(f"Loaded {len(medicines)} medicines from Kaggle dataset")
             return medicines
             
@@ -88,27 +113,31 @@ class IndianMedicineDataFetcher:
             logger.error(f"Error loading Kaggle dataset: {str(e)}")
             return []
             
+    def iter_kaggle_dataset(self, file_path: str, chunksize: int = 10000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream medicines from the Kaggle CSV, reading `chunksize` rows at a time
+        so memory stays bounded regardless of file size. Read errors propagate:
+        a half-read file must not look like a complete one to the caller
+        """
+        for chunk in pd.read_csv(file_path, usecols=lambda c: c in KAGGLE_COLUMNS, dtype=str, chunksize=chunksize):
+            yield from self._kaggle_records(chunk)
+            
+    def _kaggle_records(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+        """Medicine records from a Kaggle frame, built column-wise rather than row by row"""
+        df = _normalise_frame(df, KAGGLE_COLUMNS)
+        df['source'] = 'Kaggle Indian Medicine Dataset'
+        return df.to_dict('records')
+        
     def load_github_dataset(self, file_path: str) -> List[Dict[str, Any]]:
         """
         Load Indian medicine data from GitHub dataset
         Dataset: https://github.com/junioralive/Indian-Medicine-Dataset
         """
         try:
-            with open(file_path, 'r') as f:
+            with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
-                
-            medicines = []
-            for medicine in data:
-                medicines.append({
-                    'name': medicine.get('brand_name', ''),
-                    'generic_name': medicine.get('generic_name', ''),
-                    'manufacturer': medicine.get('manufacturer', ''),
-                    'composition': medicine.get('composition', ''),
-                    'category': medicine.get('category', ''),
-                    'price': medicine.get('price', ''),
-                    'source': 'GitHub Indian Medicine Dataset'
-                })
-                
+            medicines = self._github_records(data)
+            
             logger.info(f"Loaded {len(medicines)} medicines from GitHub dataset")
             return medicines
             
@@ -116,6 +145,39 @@ class IndianMedicineDataFetcher:
             logger.error(f"Error loading GitHub dataset: {str(e)}")
             return []
             
+    def iter_github_dataset(self, file_path: str, batch_size: int = 10000) -> Iterator[Dict[str, Any]]:
+        """
+        Stream medicines from the GitHub JSON array, parsing one item at a time
+        instead of loading the whole file, normalised `batch_size` items at a time.
+        Read and parse errors propagate, as in `iter_kaggle_dataset`
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            items = iter_json_array(f)
+            while True:
+                batch = list(itertools.islice(items, batch_size))
+                if not batch:
+                    break
+                yield from self._github_records(batch)
+                
+    def _github_records(self, data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Medicine records from raw GitHub items.
+        
+        The items are already Python dicts, so one comprehension beats a
+        DataFrame round trip; values are normalised like `_normalise_frame`.
+        """
+        return [
+            {
+                'name': _clean_text(medicine.get('brand_name')),
+                'generic_name': _clean_text(medicine.get('generic_name')),
+                'manufacturer': _clean_text(medicine.get('manufacturer')),
+                'composition': _clean_text(medicine.get('composition')),
+                'category': _clean_text(medicine.get('category')),
+                'price': _clean_price(medicine.get('price')),
+                'source': 'GitHub Indian Medicine Dataset'
+            }
+            for medicine in data
+        ]
+        
     def create_documents_for_vectordb(self, medicine_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Convert Indian medicine data into documents for vector database"""
         documents = []
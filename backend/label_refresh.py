@@ -0,0 +1,233 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Dict, Any, Optional, Callable
+import logging
+from vector_db import MedicineVectorDB
+from data_fetcher import FDADataFetcher
+
+try:
+    import fcntl
+except ImportError:  # Not on POSIX: assume a single process serves the database
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+@contextmanager
+def file_lock(path: str, blocking: bool = True):
+    """Exclusive advisory lock on `path` shared by all processes; yields whether it was acquired"""
+    if fcntl is None:
+        yield True
+        return
+    with open(path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+class LabelRefresher:
+    """Keeps the FDA label documents current without rebuilding the corpus.
+
+    For every indexed drug the label's set_id, version and effective_time
+    are tracked in a JSON state file. A refresh asks openFDA only for those
+    set IDs with an effective_time since the last sync (minus `lookback_days`,
+    since labels can be posted after their effective date), and re-embeds
+    only drugs whose label version changed.
+
+    The served database is never modified in place: `update_documents`
+    loads a copy from disk, upserts into it, saves it and hands it to
+    `on_swap`, while readers keep searching the previous instance. Writes
+    from every process sharing `db_path` are serialised by a lock file, and
+    only one process runs the schedule; the others reload the database
+    whenever it is saved.
+    """
+
+    def __init__(self, fetcher: FDADataFetcher, vector_db: MedicineVectorDB, db_path: str,
+                 state_path: Optional[str] = None, lock: Optional[threading.Lock] = None,
+                 lookback_days: int = 30, on_swap: Optional[Callable[[MedicineVectorDB], None]] = None,
+                 reload_seconds: float = 60.0):
+        self.fetcher = fetcher
+        self.vector_db = vector_db
+        self.db_path = db_path
+        self.state_path = state_path or f"{db_path}.labels.json"
+        self.lookback_days = lookback_days
+        self.on_swap = on_swap
+        self.reload_seconds = reload_seconds
+        # Serialises writes to the vector database with other writers (e.g. a full initialisation)
+        self.lock = lock or threading.Lock()
+        self.state = {'last_sync': None, 'labels': {}}
+        self._stop = threading.Event()
+        self._thread = None
+        self._loaded_version = self._saved_version()
+        self._load_state()
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.state.update(json.load(f))
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive write access to the database and state files, across threads and processes"""
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self.lock, file_lock(f"{self.db_path}.write.lock"):
+            yield
+
+    def _saved_version(self):
+        """Modification time of the last saved database, or None if none was saved"""
+        try:
+            return os.stat(f"{self.db_path}.json").st_mtime_ns
+        except OSError:
+            return None
+
+    def _swap(self, vector_db: MedicineVectorDB):
+        self.vector_db = vector_db
+        self._loaded_version = self._saved_version()
+        if self.on_swap is not None:
+            self.on_swap(vector_db)
+
+    def update_documents(self, documents: List[Dict[str, Any]],
+                         labels: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Replace the stored chunks of the documents' drugs in a copy of the database and swap it in.
+
+        `labels` are the processed labels the documents were built from,
+        recorded as synced once the database is saved.
+        """
+        with self._writing():
+            stats = self._update_documents(documents)
+            if labels is not None:
+                self._load_state()
+                self.record(labels)
+            return stats
+
+    def _update_documents(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # Start from the saved database, which may include another process's writes
+        saved = self.db_path if self._saved_version() is not None else None
+        updated = self.vector_db.reopen(saved)
+        stats = updated.upsert_documents(documents, replace_drugs=True)
+        updated.save(self.db_path)
+        self._swap(updated)
+        return stats
+
+    def reload_if_changed(self) -> bool:
+        """Swap in the saved database if another process saved it since it was loaded here"""
+        version = self._saved_version()
+        if version is None or version == self._loaded_version:
+            return False
+        # Under the write lock, so the files are not read halfway through a save
+        with self._writing():
+            self._swap(self.vector_db.reopen(self.db_path))
+            self._load_state()
+        logger.info(f"Reloaded vector database saved by another process from {self.db_path}")
+        return True
+
+    def record(self, labels: List[Dict[str, Any]], synced: bool = True):
+        """Track the set_id/version/effective_time of processed labels now in the index"""
+        for label in labels:
+            if label.get('set_id'):
+                self.state['labels'][label['drug_name']] = {
+                    'set_id': label['set_id'],
+                    'version': label.get('version'),
+                    'effective_time': label.get('effective_time')
+                }
+        if synced:
+            self.state['last_sync'] = date.today().strftime('%Y%m%d')
+        self._save_state()
+
+    def _save_state(self):
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def refresh(self) -> Dict[str, Any]:
+        """Fetch labels changed since the last sync and swap their drugs' documents into the index"""
+        with self._writing():
+            # Another process may have synced since this one last read the state
+            self._load_state()
+            return self._refresh()
+
+    def _refresh(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        tracked = self.state['labels']
+        drugs_by_set_id = {info['set_id']: drug for drug, info in tracked.items()}
+        if not drugs_by_set_id:
+            logger.warning("No tracked labels to refresh; initialize the database first")
+            return {'tracked_labels': 0, 'changed_labels': 0}
+
+        since = None
+        if self.state.get('last_sync'):
+            last_sync = datetime.strptime(self.state['last_sync'], '%Y%m%d').date()
+            since = (last_sync - timedelta(days=self.lookback_days)).strftime('%Y%m%d')
+
+        changed = []
+        for result in self.fetcher.fetch_labels_by_set_id(list(drugs_by_set_id), since=since):
+            drug_name = drugs_by_set_id.get(result.get('set_id'))
+            if drug_name is None or result.get('version') == tracked[drug_name].get('version'):
+                continue
+            processed = self.fetcher._process_label_result(result, drug_name)
+            if processed:
+                changed.append(processed)
+
+        documents = [document for label in changed for document in self.fetcher.create_document_for_vectordb(label)]
+        upsert_stats = self._update_documents(documents) if documents else {}
+        self.record(changed)
+
+        stats = {
+            'tracked_labels': len(drugs_by_set_id),
+            'changed_labels': len(changed),
+            'changed_drugs': [label['drug_name'] for label in changed],
+            'documents': len(documents),
+            'embedded_chunks': upsert_stats.get('embedded_chunks', 0),
+            'seconds': time.perf_counter() - start
+        }
+        logger.info(f"Label refresh since {since}: {stats}")
+        return stats
+
+    def start(self, interval_hours: float):
+        """Refresh every `interval_hours` in a background thread until `stop` is called.
+
+        Of the processes sharing `db_path`, the first to start holds the
+        schedule lock and refreshes; the rest only reload what it saves.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        if os.path.dirname(self.db_path):
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+
+        def run():
+            with file_lock(f"{self.db_path}.schedule.lock", blocking=False) as acquired:
+                if acquired:
+                    logger.info(f"Scheduled label refresh every {interval_hours}h")
+                next_refresh = time.monotonic() + interval_hours * 3600
+                while not self._stop.wait(self.reload_seconds):
+                    try:
+                        if acquired and time.monotonic() >= next_refresh:
+                            next_refresh = time.monotonic() + interval_hours * 3600
+                            self.refresh()
+                        else:
+                            self.reload_if_changed()
+                    except Exception as e:
+                        logger.error(f"Label refresh failed: {str(e)}")
+
+        self._thread = threading.Thread(target=run, name="label-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
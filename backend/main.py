@@ -25,6 +25,23 @@ app.add_middleware(
 # Initialize RAG pipeline
 rag_pipeline = MedicineRAGPipeline()
 
+# Upper bound on drugs in one /check-regimen request
+MAX_REGIMEN_DRUGS = 50
+
+@app.on_event("startup")
+async def schedule_label_refresh():
+    """Start periodic incremental FDA label refreshes when LABEL_REFRESH_HOURS is set.
+    
+    With several workers, one runs the refreshes and the others reload the database it saves.
+    """
+    interval = float(os.getenv("LABEL_REFRESH_HOURS", "0") or 0)
+    if interval > 0:
+        rag_pipeline.label_refresher.start(interval)
+
+@app.on_event("shutdown")
+async def stop_label_refresh():
+    rag_pipeline.label_refresher.stop()
+
 # Request/Response models
 class QueryRequest(BaseModel):
     query: str
@@ -33,6 +50,9 @@ class DrugInteractionRequest(BaseModel):
     drug1: str
     drug2: str
     
+class RegimenRequest(BaseModel):
+    drugs: List[str]
+    
 class InitializeDatabaseRequest(BaseModel):
     confirm: bool = False
     
@@ -50,10 +70,22 @@ class DrugInteractionResponse(BaseModel):
     interactions: List[Dict[str, Any]]
     response: str
     sources: List[str]
+    timed_out_stages: List[str] = []
+    
+class RegimenResponse(BaseModel):
+    drugs: List[str]
+    unresolved_drugs: List[str]
+    interaction_found: bool
+    interactions: List[Dict[str, Any]]
+    response: str
+    sources: List[str]
+    timed_out_stages: List[str] = []
     
 class HealthResponse(BaseModel):
     status: str
     vector_db_stats: Dict[str, Any]
+    http_cache_stats: Optional[Dict[str, Any]] = None
+    rxcui_table_stats: Optional[Dict[str, Any]] = None
 
 @app.get("/", response_model=Dict[str, str])
 async def root():
@@ -70,14 +102,16 @@ async def health_check():
     stats = rag_pipeline.vector_db.get_stats()
     return {
         "status": "healthy",
-        "vector_db_stats": stats
+        "vector_db_stats": stats,
+        "http_cache_stats": rag_pipeline.data_fetcher.get_cache_stats(),
+        "rxcui_table_stats": rag_pipeline.data_fetcher.get_rxcui_stats()
     }
 
 @app.post("/query", response_model=QueryResponse)
 async def process_query(request: QueryRequest):
     """Process a general medicine-related query"""
     try:
-        result = rag_pipeline.process_query(request.query)
+        result = await rag_pipeline.aprocess_query(request.query)
         return QueryResponse(**result)
     except Exception as e:
         logger.error(f"Error processing query: {str(e)}")
@@ -87,7 +121,7 @@ async def process_query(request: QueryRequest):
 async def check_drug_interaction(request: DrugInteractionRequest):
     """Check for interactions between two specific drugs"""
     try:
-        result = rag_pipeline.check_drug_interaction(
+        result = await rag_pipeline.acheck_drug_interaction(
             request.drug1,
             request.drug2
         )
@@ -96,6 +130,22 @@ async def check_drug_interaction(request: DrugInteractionRequest):
         logger.error(f"Error checking drug interaction: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/check-regimen", response_model=RegimenResponse)
+async def check_regimen(request: RegimenRequest):
+    """Check every pair of drugs in a multi-drug regimen for interactions"""
+    drugs = [drug.strip() for drug in request.drugs if drug.strip()]
+    if len(drugs) < 2:
+        raise HTTPException(status_code=400, detail="Provide at least two drugs")
+    if len(drugs) > MAX_REGIMEN_DRUGS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_REGIMEN_DRUGS} drugs per regimen")
+        
+    try:
+        result = await rag_pipeline.acheck_regimen(drugs)
+        return RegimenResponse(**result)
+    except Exception as e:
+        logger.error(f"Error checking regimen: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/initialize-database")
 async def initialize_database(
     request: InitializeDatabaseRequest,
@@ -116,6 +166,16 @@ async def initialize_database(
         "status": "processing"
     }
 
+@app.post("/refresh-labels")
+async def refresh_labels(background_tasks: BackgroundTasks):
+    """Fetch FDA labels changed since the last sync and re-embed only those drugs"""
+    background_tasks.add_task(rag_pipeline.refresh_labels)
+    
+    return {
+        "message": "Label refresh started in background",
+        "status": "processing"
+    }
+
 @app.get("/supported-queries")
 async def get_supported_queries():
     """Get examples of supported query types"""
@@ -0,0 +1,161 @@
+import re
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import logging
+from comprehensive_drug_database import COMPREHENSIVE_DRUG_DATABASE
+from data_fetcher import COMMON_DRUGS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+QUERY_TYPES = ('interaction', 'side_effects', 'usage', 'dosage', 'warnings', 'general')
+
+_WORD = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+_PARENTHETICAL = re.compile(r'\([^)]*\)')
+
+# Single-word brand names shorter than this ("Zen", "Mox", "Omez") double as everyday
+# words or fragments, so they only count next to a strength or a dosage-form word
+MIN_BRAND_LENGTH = 5
+_DRUG_CONTEXT = re.compile(
+    r'\b(?:tablets?|tabs?|capsules?|caps?|syrups?|injections?|pills?|medicines?|medications?|drugs?|'
+    r'\d+(?:\.\d+)?\s?(?:mg|mcg|ml|g)|dos(?:e|es|age))\b'
+)
+
+# (pattern, weight) per intent, matched against the lower-cased query
+INTENT_PATTERNS = {
+    'interaction': [
+        (r'\binteract', 3.0), (r'\btogether\b', 2.5), (r'\bcombin', 2.5), (r'\bmix(?:ing|ed)?\b', 2.0),
+        (r'\b(?:take|taking|use|using)\b.+\b(?:with|and|alongside)\b', 1.0),
+    ],
+    'side_effects': [
+        (r'\bside[\s-]?effects?\b', 3.0), (r'\badverse\b', 2.5), (r'\breactions?\b', 1.5),
+        (r'\beffects?\b', 1.0), (r'\b(?:cause|causes|caused)\b', 1.0), (r'\bsymptoms?\b', 1.0),
+    ],
+    'usage': [
+        (r'\bused (?:for|to)\b', 3.0), (r'\buses?\b', 2.0), (r'\bwhat is\b', 1.5), (r'\bwhat does\b', 1.5),
+        (r'\btreat', 2.0), (r'\bindicat', 2.0), (r'\bpurpose\b', 2.0), (r'\bhow does\b.+\bwork\b', 2.5),
+        (r'\bgood for\b', 2.0), (r'\bhelp (?:with|for)\b', 1.5),
+    ],
+    'dosage': [
+        (r'\bdos(?:e|es|age|ing)\b', 3.0), (r'\bhow (?:much|many|often)\b', 2.5), (r'\b\d+\s?(?:mg|mcg|ml|g)\b', 1.5),
+        (r'\bmissed\b', 2.0), (r'\bmaximum\b', 1.5), (r'\b(?:per day|daily|twice|once a day)\b', 1.5),
+        (r'\bwhen (?:should|to) (?:i )?take\b', 2.0),
+    ],
+    'warnings': [
+        (r'\bwarnings?\b', 3.0), (r'\bprecautions?\b', 3.0), (r'\bcontraindicat', 2.5), (r'\bpregnan', 2.5),
+        (r'\bbreast[\s-]?feed', 2.5), (r'\balcohol\b', 1.5), (r'\bsafe\b', 1.0), (r'\brisks?\b', 1.5),
+        (r'\boverdose\b', 2.5), (r'\bdangerous\b', 2.0), (r'\bavoid\b', 1.5),
+    ],
+}
+
+class QueryClassifier:
+    """In-process query classifier: dictionary drug matching plus weighted intent patterns.
+
+    Drug and brand names are looked up as word n-grams in a dictionary built
+    once, so matching cost depends on the query length, not the number of
+    names. Drugs are reported as the user named them; `names_for` adds a
+    brand's generic name for retrieval. Each intent scores the sum of its
+    matching pattern weights; confidence reflects how clearly the top intent
+    wins and whether any drug was recognised.
+    """
+
+    def __init__(self, extra_names: Optional[Iterable[str]] = None):
+        self.names: Dict[Tuple[str, ...], str] = {}
+        self.generic_names: Dict[str, str] = {}
+        self.ambiguous = set()
+        for name in [*COMPREHENSIVE_DRUG_DATABASE, *COMMON_DRUGS]:
+            self._add_name(name, generic=True)
+        for generic, drug_info in COMPREHENSIVE_DRUG_DATABASE.items():
+            for brand in drug_info.get('brand_names', []):
+                self._add_name(brand, generic=False, generic_name=generic)
+        for name in extra_names or []:
+            self._add_name(name, generic=False)
+        self.max_words = max((len(key) for key in self.names), default=1)
+        self.patterns = {
+            intent: [(re.compile(pattern), weight) for pattern, weight in patterns]
+            for intent, patterns in INTENT_PATTERNS.items()
+        }
+
+    def _add_name(self, name: str, generic: bool, generic_name: Optional[str] = None):
+        # "Combiflam (with paracetamol)" is written "Combiflam"
+        key = tuple(_WORD.findall(_PARENTHETICAL.sub(' ', name).lower()))
+        if not key or key in self.names:
+            return
+        self.names[key] = ' '.join(key)
+        if generic_name and generic_name.strip().lower() != self.names[key]:
+            self.generic_names[self.names[key]] = generic_name.strip().lower()
+        if not generic and len(key) == 1 and len(key[0]) < MIN_BRAND_LENGTH:
+            self.ambiguous.add(key)
+
+    def names_for(self, drug: str) -> List[str]:
+        """Names a drug's documents may be stored under: as named, plus the generic name of a brand"""
+        drug = drug.strip().lower()
+        return [drug, self.generic_names[drug]] if drug in self.generic_names else [drug]
+
+    def _distinct(self, drugs: List[str]) -> int:
+        """Number of different drugs, counting a brand and its generic once"""
+        return len({self.generic_names.get(drug, drug) for drug in drugs})
+
+    def extract_drugs(self, query: str) -> List[str]:
+        """Known drugs mentioned in `query`, in order of appearance; longest names win"""
+        text = query.lower()
+        words = _WORD.findall(text)
+        drug_context = None
+        drugs = []
+        i = 0
+        while i < len(words):
+            for n in range(min(self.max_words, len(words) - i), 0, -1):
+                key = tuple(words[i:i + n])
+                drug = self.names.get(key)
+                if drug is not None and key in self.ambiguous:
+                    if drug_context is None:
+                        drug_context = _DRUG_CONTEXT.search(text) is not None
+                    followed_by_strength = i + 1 < len(words) and words[i + 1][0].isdigit()
+                    if not (drug_context or followed_by_strength):
+                        drug = None
+                if drug is not None:
+                    if drug not in drugs:
+                        drugs.append(drug)
+                    i += n
+                    break
+            else:
+                i += 1
+        return drugs
+
+    def score_intents(self, query: str, drugs: List[str]) -> Dict[str, float]:
+        text = query.lower()
+        scores = {
+            intent: sum(weight for pattern, weight in patterns if pattern.search(text))
+            for intent, patterns in self.patterns.items()
+        }
+        # Two or more drugs in one question is itself a strong interaction signal
+        if self._distinct(drugs) >= 2:
+            scores['interaction'] += 2.0
+        return scores
+
+    def classify(self, query: str) -> Dict[str, Any]:
+        """{"drugs": [...], "query_type": ..., "confidence": 0..1}, shaped like the LLM classifier's output"""
+        drugs = self.extract_drugs(query)
+        scores = self.score_intents(query, drugs)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        (best, top), (_, runner_up) = ranked[0], ranked[1]
+
+        if top == 0:
+            # No intent signal: a general question, or one phrased in a way the patterns miss
+            query_type, confidence = 'general', 0.5
+        else:
+            query_type = best
+            confidence = top / (top + runner_up)
+            if top < 2.0:
+                confidence *= 0.8
+        if query_type == 'interaction' and self._distinct(drugs) < 2:
+            # An interaction needs two drugs, so at least one name was not recognised
+            confidence *= 0.7
+        if not drugs:
+            # The dictionary is not exhaustive, so a query naming no known drug may name an unknown one
+            confidence *= 0.7
+
+        return {
+            'drugs': drugs,
+            'query_type': query_type,
+            'confidence': round(confidence, 3)
+        }
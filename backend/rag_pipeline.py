@@ -1,4 +1,9 @@
 import os
+import json
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from typing import List, Dict, Any, Optional
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
@@ -6,18 +11,53 @@ from langchain.schema import SystemMessage, HumanMessage
 from langchain.callbacks import StreamingStdOutCallbackHandler
 import logging
 from dotenv import load_dotenv
-from vector_db import MedicineVectorDB
+from vector_db import MedicineVectorDB, merge_results
 from data_fetcher import FDADataFetcher
+from label_refresh import LabelRefresher
+from query_classifier import QueryClassifier, QUERY_TYPES
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Seconds each stage of an interaction check may take before the answer is built without it
+STAGE_TIMEOUTS = {
+    'rxnorm': 5.0,
+    'retrieval': 3.0,
+    'generation': 30.0,
+}
+
 class MedicineRAGPipeline:
-    def __init__(self, vector_db_path: str = "./data/vector_db"):
-        self.vector_db = MedicineVectorDB()
+    def __init__(self, vector_db_path: str = "./data/vector_db", classifier_threshold: Optional[float] = None,
+                 stage_timeouts: Optional[Dict[str, float]] = None):
+        self.vector_db = MedicineVectorDB(
+            embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", f"{vector_db_path}.embeddings.sqlite")
+        )
         self.vector_db_path = vector_db_path
-        self.data_fetcher = FDADataFetcher()
+        self.data_fetcher = FDADataFetcher(
+            cache_path=os.getenv("HTTP_CACHE_PATH", f"{vector_db_path}.http_cache.sqlite"),
+            rxcui_table_path=os.getenv("RXCUI_TABLE_PATH", f"{vector_db_path}.rxcui.json")
+        )
+        
+        # Full initialisation and incremental label refreshes both write the index, always into a
+        # copy that replaces `self.vector_db` once saved; requests read `self.vector_db` once each
+        self.write_lock = threading.Lock()
+        self.label_refresher = LabelRefresher(
+            self.data_fetcher, self.vector_db, vector_db_path, lock=self.write_lock, on_swap=self._use_vector_db
+        )
+        
+        # Async entry points run embedding, search and HTTP calls here, off the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("PIPELINE_WORKERS", "8")),
+            thread_name_prefix="rag-pipeline"
+        )
+        # RxNorm calls get their own threads: a slow or timed-out lookup keeps waiting on the
+        # network there instead of taking a worker that embedding and search need
+        self.network_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("NETWORK_WORKERS", "8")),
+            thread_name_prefix="rag-network"
+        )
+        self.stage_timeouts = {**STAGE_TIMEOUTS, **(stage_timeouts or {})}
         
         # Initialize LLM
         self.llm = ChatOpenAI(
@@ -35,8 +75,38 @@ class MedicineRAGPipeline:
         else:
             logger.info("No existing vector database found")
             
+        # Local classifier over the known drug names; the LLM is only asked when it is unsure
+        self.query_classifier = QueryClassifier(extra_names=self.vector_db.drug_names())
+        self.classifier_threshold = (
+            classifier_threshold if classifier_threshold is not None
+            else float(os.getenv("CLASSIFIER_CONFIDENCE", "0.6"))
+        )
+            
     def classify_query(self, query: str) -> Dict[str, Any]:
         """Classify the user query to determine intent and extract drug names"""
+        classification = self.query_classifier.classify(query)
+        if classification['confidence'] >= self.classifier_threshold:
+            return classification
+            
+        logger.info(f"Low classifier confidence ({classification['confidence']}), asking the LLM")
+        return self.classify_query_with_llm(query, fallback=classification)
+        
+    def classify_query_with_llm(self, query: str, fallback: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """LLM classification; `fallback` is returned if the reply cannot be parsed"""
+        response = self.llm.invoke(self._classification_messages(query))
+        return self._parse_classification(response.content, fallback)
+        
+    async def aclassify_query(self, query: str) -> Dict[str, Any]:
+        """Async `classify_query`: the local classifier runs inline, the LLM fallback is awaited"""
+        classification = self.query_classifier.classify(query)
+        if classification['confidence'] >= self.classifier_threshold:
+            return classification
+            
+        logger.info(f"Low classifier confidence ({classification['confidence']}), asking the LLM")
+        response = await self.llm.ainvoke(self._classification_messages(query))
+        return self._parse_classification(response.content, classification)
+        
+    def _classification_messages(self, query: str):
         classification_prompt = ChatPromptTemplate.from_messages([
             SystemMessage(content="""You are a medical query classifier. 
             Analyze the user query and:
@@ -46,50 +116,78 @@ class MedicineRAGPipeline:
             """),
             HumanMessage(content=query)
         ])
+        return classification_prompt.format_messages()
         
-        response = self.llm.invoke(classification_prompt.format_messages())
+    def _parse_classification(self, content: str, fallback: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        fallback = fallback or {"drugs": [], "query_type": "general"}
         
         # Parse response (simplified - in production, use proper JSON parsing)
         try:
-            import json
-            content = response.content
             # Extract JSON from response
             start = content.find('{')
             end = content.rfind('}') + 1
             if start != -1 and end != 0:
                 classification = json.loads(content[start:end])
             else:
-                classification = {"drugs": [], "query_type": "general"}
+                classification = fallback
         except:
-            classification = {"drugs": [], "query_type": "general"}
+            classification = fallback
             
+        if classification.get('query_type') not in QUERY_TYPES:
+            classification['query_type'] = fallback.get('query_type', 'general')
         return classification
         
     def retrieve_context(self, query: str, drugs: List[str], k: int = 5) -> List[Dict[str, Any]]:
         """Retrieve relevant context from vector database"""
-        # Search for query
-        results = self.vector_db.search(query, k=k)
-        
-        # Also search for each drug mentioned
-        for drug in drugs:
-            drug_results = self.vector_db.search(drug, k=3)
-            results.extend(drug_results)
-            
         # Deduplicate and sort by relevance
-        seen = set()
-        unique_results = []
-        for r in results:
-            content_hash = hash(r['content'])
-            if content_hash not in seen:
-                seen.add(content_hash)
-                unique_results.append(r)
-                
-        return unique_results[:k]
+        return merge_results(self._search_context(query, drugs, k), limit=k)
+        
+    async def aretrieve_context(self, query: str, drugs: List[str], k: int = 5) -> List[Dict[str, Any]]:
+        """Async `retrieve_context`: embedding and search run on the pipeline's executor"""
+        return merge_results(await self._run_blocking(self._search_context, query, drugs, k), limit=k)
+        
+    def _search_context(self, query: Optional[str], drugs: List[str], k: int) -> List[List[Dict[str, Any]]]:
+        """Results for the query text (if given) and each drug mentioned, one list per search"""
+        # Search for the query and each drug mentioned in one batch: drug
+        # lookups are scoped to the drug's own chunks, falling back to a global
+        # search for names the database doesn't index. A brand is matched under
+        # both its own and its generic name, since FDA labels are stored by
+        # generic and Indian medicines by brand. Hybrid retrieval matches exact
+        # names and doses lexically; bare drug-name lookups never need the
+        # embedding model
+        queries = ([query] if query else []) + drugs
+        if not queries:
+            return []
+        ks = ([k] if query else []) + [3] * len(drugs)
+        filters = ([None] if query else []) + [
+            {'drug_name': self.query_classifier.names_for(drug)} for drug in drugs
+        ]
+        return self.vector_db.search_many(queries, ks, filters, unfiltered_fallback=True, mode='hybrid')
+        
+    async def _run_blocking(self, func, *args):
+        """Run a blocking (CPU-bound or I/O) call on the executor without stalling the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        
+    async def _run_network(self, func, *args):
+        """Like `_run_blocking`, for external HTTP calls, on the network executor"""
+        return await asyncio.get_running_loop().run_in_executor(self.network_executor, func, *args)
+        
+    def _stage_deadline(self, stage: str, start: Optional[float] = None) -> float:
+        """`time.monotonic()` by which `stage`, started at `start` (default now), must finish"""
+        return (time.monotonic() if start is None else start) + self.stage_timeouts[stage]
         
     def generate_response(self, query: str, context: List[Dict[str, Any]], 
                          query_type: str) -> str:
         """Generate response using LLM with retrieved context"""
+        response = self.llm.invoke(self._response_messages(query, context, query_type))
+        return response.content
+        
+    async def agenerate_response(self, query: str, context: List[Dict[str, Any]], query_type: str) -> str:
+        """Async `generate_response`, awaiting the LLM instead of blocking on it"""
+        response = await self.llm.ainvoke(self._response_messages(query, context, query_type))
+        return response.content
         
+    def _response_messages(self, query: str, context: List[Dict[str, Any]], query_type: str):
         # Prepare context string
         context_str = "\n\n".join([
             f"Source: {doc['metadata']['source']} - {doc['metadata']['section']}\n{doc['content']}"
@@ -168,9 +266,7 @@ Provide a helpful, accurate response based on the available information. Always
             SystemMessage(content=prompt_template.format(context=context_str, query=query)),
             HumanMessage(content="Please provide a response.")
         ])
-        
-        response = self.llm.invoke(prompt.format_messages())
-        return response.content
+        return prompt.format_messages()
         
     def process_query(self, query: str) -> Dict[str, Any]:
         """Main pipeline to process user queries"""
@@ -200,6 +296,44 @@ Provide a helpful, accurate response based on the available information. Always
             'sources_used': len(context)
         }
         
+    async def aprocess_query(self, query: str) -> Dict[str, Any]:
+        """Async `process_query`.
+        
+        The query-text search does not depend on classification, so it runs
+        on the executor while the query is classified; only the drug-scoped
+        searches wait for the extracted drug names.
+        """
+        logger.info(f"Processing query: {query}")
+        
+        query_search = asyncio.ensure_future(self._run_blocking(self._search_context, query, [], 5))
+        try:
+            classification = await self.aclassify_query(query)
+        except BaseException:
+            query_search.cancel()
+            raise
+        drugs = classification.get('drugs', [])
+        query_type = classification.get('query_type', 'general')
+        
+        logger.info(f"Identified drugs: {drugs}, Query type: {query_type}")
+        
+        results = await query_search
+        if drugs:
+            results = results + await self._run_blocking(self._search_context, None, drugs, 5)
+        context = merge_results(results, limit=5)
+        
+        if context:
+            response = await self.agenerate_response(query, context, query_type)
+        else:
+            response = self._generate_no_data_response(query, drugs)
+            
+        return {
+            'query': query,
+            'drugs_identified': drugs,
+            'query_type': query_type,
+            'response': response,
+            'sources_used': len(context)
+        }
+        
     def _generate_no_data_response(self, query: str, drugs: List[str]) -> str:
         """Generate response when no data is found"""
         drug_names = ", ".join(drugs) if drugs else "the requested medications"
@@ -219,53 +353,248 @@ Your health and safety are important, so always verify medication information wi
         # Fetch common drugs data
         drugs_data = self.data_fetcher.fetch_common_drugs_data()
         
+        # Preload RxCUIs so interaction checks skip the name lookups
+        logger.info(f"RxCUI table holds {self.data_fetcher.seed_rxcui_table()} drugs")
+        
         # Convert to documents
         all_documents = []
         for drug_data in drugs_data:
             documents = self.data_fetcher.create_document_for_vectordb(drug_data)
             all_documents.extend(documents)
             
-        # Add to vector database
+        # Add to vector database, replacing what is already stored for these drugs;
+        # later refreshes only fetch labels whose version moved on from these
         if all_documents:
-            self.vector_db.add_documents(all_documents)
-            self.vector_db.save(self.vector_db_path)
+            self.label_refresher.update_documents(all_documents, labels=drugs_data)
             logger.info(f"Initialized database with {len(all_documents)} documents")
         else:
             logger.warning("No documents to add to database")
             
+    def _use_vector_db(self, vector_db: MedicineVectorDB):
+        """Serve `vector_db` from now on; searches already running finish on the previous instance.
+
+        The classifier is rebuilt over the new instance's drug names, so drugs added by
+        initialisation or a label refresh are recognised in queries right away.
+        """
+        query_classifier = QueryClassifier(extra_names=vector_db.drug_names())
+        self.vector_db = vector_db
+        self.query_classifier = query_classifier
+        
+    def refresh_labels(self) -> Dict[str, Any]:
+        """Re-embed only the drugs whose FDA label changed since the last sync"""
+        return self.label_refresher.refresh()
+            
     def check_drug_interaction(self, drug1: str, drug2: str) -> Dict[str, Any]:
-        """Check for specific drug-drug interactions"""
-        # First try RxNorm API
-        interaction_data = self.data_fetcher.get_drug_interactions(drug1, drug2)
-        
-        # Also search vector database for interaction information
-        query = f"{drug1} {drug2} interaction"
-        context = self.retrieve_context(query, [drug1, drug2], k=10)
-        
-        # Generate comprehensive response
-        if interaction_data['status'] == 'success' or context:
-            response = self.generate_response(
-                f"Can I take {drug1} with {drug2}?",
-                context,
-                "interaction"
+        """Check for specific drug-drug interactions.
+        
+        RxNorm and the label search run concurrently, each with its own
+        deadline; a stage that misses it is reported in 'timed_out_stages'
+        and the answer is built from whatever finished.
+        """
+        start = time.monotonic()
+        timed_out = []
+        rxnorm = self.network_executor.submit(
+            self.data_fetcher.get_drug_interactions, drug1, drug2, self._stage_deadline('rxnorm', start)
+        )
+        retrieval = self.executor.submit(self.retrieve_context, f"{drug1} {drug2} interaction", [drug1, drug2], 10)
+        
+        interaction_data = self._stage_result(rxnorm, 'rxnorm', start, timed_out, {'status': 'timeout'})
+        context = self._stage_result(retrieval, 'retrieval', start, timed_out, [])
+        
+        query, context = self._interaction_prompt(drug1, drug2, interaction_data, context)
+        response = None
+        if context:
+            generation = self.executor.submit(self.generate_response, query, context, "interaction")
+            response = self._stage_result(generation, 'generation', time.monotonic(), timed_out, None)
+        return self._interaction_result(drug1, drug2, interaction_data, context, response, timed_out)
+        
+    async def acheck_drug_interaction(self, drug1: str, drug2: str) -> Dict[str, Any]:
+        """Async `check_drug_interaction` with the same per-stage deadlines"""
+        timed_out = []
+        interaction_data, context = await asyncio.gather(
+            self._with_deadline(
+                self._run_network(
+                    self.data_fetcher.get_drug_interactions, drug1, drug2, self._stage_deadline('rxnorm')
+                ),
+                'rxnorm', timed_out, {'status': 'timeout'}
+            ),
+            self._with_deadline(
+                self.aretrieve_context(f"{drug1} {drug2} interaction", [drug1, drug2], k=10),
+                'retrieval', timed_out, []
             )
-            
-            return {
-                'drug1': drug1,
-                'drug2': drug2,
-                'interaction_found': interaction_data.get('interaction_found', False),
-                'interactions': interaction_data.get('interactions', []),
-                'response': response,
-                'sources': ['RxNorm', 'FDA Labels']
-            }
-        else:
-            return {
-                'drug1': drug1,
-                'drug2': drug2,
-                'interaction_found': False,
-                'response': self._generate_no_data_response(
+        )
+        
+        query, context = self._interaction_prompt(drug1, drug2, interaction_data, context)
+        response = None
+        if context:
+            response = await self._with_deadline(
+                self.agenerate_response(query, context, "interaction"), 'generation', timed_out, None
+            )
+        return self._interaction_result(drug1, drug2, interaction_data, context, response, timed_out)
+        
+    def _stage_result(self, future, stage: str, start: float, timed_out: List[str], default: Any) -> Any:
+        """Result of a stage's future, or `default` once the stage's deadline (from `start`) passes"""
+        try:
+            result = future.result(timeout=max(0.0, start + self.stage_timeouts[stage] - time.monotonic()))
+        except FutureTimeoutError:
+            # The worker finishes in the background; RxNorm calls give up at the same deadline
+            self._missed_deadline(stage, timed_out)
+            return default
+        return self._checked_result(result, stage, timed_out)
+        
+    async def _with_deadline(self, awaitable, stage: str, timed_out: List[str], default: Any) -> Any:
+        try:
+            result = await asyncio.wait_for(awaitable, self.stage_timeouts[stage])
+        except asyncio.TimeoutError:
+            self._missed_deadline(stage, timed_out)
+            return default
+        return self._checked_result(result, stage, timed_out)
+        
+    def _checked_result(self, result: Any, stage: str, timed_out: List[str]) -> Any:
+        # RxNorm calls stop at the stage deadline themselves and report it as their status
+        if isinstance(result, dict) and result.get('status') == 'timeout':
+            self._missed_deadline(stage, timed_out)
+        return result
+        
+    def _missed_deadline(self, stage: str, timed_out: List[str]):
+        timed_out.append(stage)
+        logger.warning(f"Stage '{stage}' missed its {self.stage_timeouts[stage]}s deadline")
+        
+    def _interaction_prompt(self, drug1: str, drug2: str, interaction_data: Dict[str, Any],
+                            context: List[Dict[str, Any]]):
+        """The interaction question and its context, with any RxNorm findings first"""
+        interactions = [
+            {**interaction, 'drug1': drug1, 'drug2': drug2}
+            for interaction in interaction_data.get('interactions', [])
+        ]
+        if interactions:
+            context = [self._rxnorm_context(interactions)] + context
+        return f"Can I take {drug1} with {drug2}?", context
+        
+    def _rxnorm_context(self, interactions: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """RxNorm interaction pairs as a context entry, so the LLM sees them alongside the label excerpts"""
+        return {
+            'content': "\n".join(
+                f"{pair['drug1']} + {pair['drug2']} ({pair['severity']}): {pair['description']}"
+                for pair in interactions
+            ),
+            'metadata': {'source': 'RxNorm', 'section': 'drug_interactions'}
+        }
+        
+    def _interaction_result(self, drug1: str, drug2: str, interaction_data: Dict[str, Any],
+                            context: List[Dict[str, Any]], response: Optional[str],
+                            timed_out: List[str]) -> Dict[str, Any]:
+        rxnorm_ok = interaction_data.get('status') == 'success'
+        interactions = interaction_data.get('interactions', [])
+        
+        labels = [doc for doc in context if doc['metadata']['source'] != 'RxNorm']
+        if response is None:
+            # Generation missed its deadline or had nothing to work from: answer from what arrived
+            if rxnorm_ok or labels:
+                response = self._summarise_interactions(
+                    drug1, drug2, interactions if rxnorm_ok else None, labels
+                )
+            else:
+                response = self._generate_no_data_response(
                     f"interaction between {drug1} and {drug2}",
                     [drug1, drug2]
-                ),
-                'sources': []
-            }
\ No newline at end of file
+                )
+                
+        sources = []
+        if rxnorm_ok:
+            sources.append('RxNorm')
+        if labels:
+            sources.append('FDA Labels')
+            
+        return {
+            'drug1': drug1,
+            'drug2': drug2,
+            'interaction_found': interaction_data.get('interaction_found', False),
+            'interactions': interactions,
+            'response': response,
+            'sources': sources,
+            'timed_out_stages': timed_out
+        }
+        
+    def _summarise_interactions(self, drug1: str, drug2: str, interactions: Optional[List[Dict[str, Any]]],
+                                labels: List[Dict[str, Any]]) -> str:
+        """Plain-text answer from RxNorm findings (None if RxNorm did not answer) and label excerpts"""
+        lines = []
+        if interactions:
+            lines += [f"RxNorm lists the following interactions between {drug1} and {drug2}:", ""]
+            lines += [f"• ({interaction['severity']}) {interaction['description']}" for interaction in interactions]
+        elif interactions is not None:
+            lines.append(f"RxNorm lists no known interaction between {drug1} and {drug2}.")
+        if labels:
+            lines += ["", "Relevant excerpts from the drug labels:", ""]
+            lines += [f"• {doc['content'][:300].strip()}..." for doc in labels[:3]]
+        lines += ["", "Always consult your healthcare provider before taking these medications together."]
+        return "\n".join(lines).strip()
+        
+    def check_regimen(self, drugs: List[str]) -> Dict[str, Any]:
+        """Check every pair of drugs in a regimen for interactions.
+        
+        The RxNorm query (one bulk RxCUI resolution and one list query for
+        the whole regimen) runs alongside the label search and is bounded by
+        the 'rxnorm' stage deadline, as in `check_drug_interaction`.
+        """
+        start = time.monotonic()
+        timed_out = []
+        rxnorm = self.network_executor.submit(
+            self.data_fetcher.get_regimen_interactions, drugs, self._stage_deadline('rxnorm', start)
+        )
+        context = self.retrieve_context(f"{' '.join(drugs)} interaction", drugs, k=10)
+        regimen = self._stage_result(rxnorm, 'rxnorm', start, timed_out, {'status': 'timeout'})
+        
+        query, context = self._regimen_prompt(drugs, regimen, context)
+        response = self.generate_response(query, context, "interaction") if context else None
+        return self._regimen_result(drugs, regimen, context, response, timed_out)
+        
+    async def acheck_regimen(self, drugs: List[str]) -> Dict[str, Any]:
+        """Async `check_regimen`: the RxNorm query and the label search run concurrently"""
+        timed_out = []
+        regimen, context = await asyncio.gather(
+            self._with_deadline(
+                self._run_network(self.data_fetcher.get_regimen_interactions, drugs, self._stage_deadline('rxnorm')),
+                'rxnorm', timed_out, {'status': 'timeout'}
+            ),
+            self.aretrieve_context(f"{' '.join(drugs)} interaction", drugs, k=10)
+        )
+        
+        query, context = self._regimen_prompt(drugs, regimen, context)
+        response = await self.agenerate_response(query, context, "interaction") if context else None
+        return self._regimen_result(drugs, regimen, context, response, timed_out)
+        
+    def _regimen_prompt(self, drugs: List[str], regimen: Dict[str, Any], context: List[Dict[str, Any]]):
+        """The regimen question and its context; the RxNorm findings go to the LLM alongside the label excerpts"""
+        interactions = regimen.get('interactions', [])
+        if interactions:
+            context = [self._rxnorm_context(interactions)] + context
+        return f"Can I take {', '.join(drugs)} together?", context
+        
+    def _regimen_result(self, drugs: List[str], regimen: Dict[str, Any], context: List[Dict[str, Any]],
+                        response: Optional[str], timed_out: List[str]) -> Dict[str, Any]:
+        rxnorm_ok = regimen.get('status') == 'success'
+        labels = [doc for doc in context if doc['metadata']['source'] != 'RxNorm']
+        if response is None and rxnorm_ok:
+            # No label excerpts or RxNorm findings to generate from, but RxNorm did check the regimen
+            response = self._summarise_interactions(', '.join(drugs[:-1]), drugs[-1], [], labels)
+        elif response is None:
+            response = self._generate_no_data_response(f"interactions between {', '.join(drugs)}", drugs)
+            
+        # Only the sources that actually contributed to this answer
+        sources = []
+        if rxnorm_ok:
+            sources.append('RxNorm')
+        if labels:
+            sources.append('FDA Labels')
+            
+        return {
+            'drugs': drugs,
+            'unresolved_drugs': regimen.get('unresolved', []),
+            'interaction_found': regimen.get('interaction_found', False),
+            'interactions': regimen.get('interactions', []),
+            'response': response,
+            'sources': sources,
+            'timed_out_stages': timed_out
+        }
@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import time
+import threading
+from typing import List, Dict, Any, Optional, Iterable, Tuple
+import logging
+from comprehensive_drug_database import COMPREHENSIVE_DRUG_DATABASE
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+
+def normalise_drug_name(name: str) -> str:
+    return _WHITESPACE.sub(' ', name.strip().lower())
+
+class RxCUITable:
+    """In-memory drug name -> RxCUI table, optionally persisted as JSON.
+
+    Brand names from COMPREHENSIVE_DRUG_DATABASE are aliased to their
+    generic entry, so "Xanax" and "alprazolam" share one RxCUI. Names that
+    RxNorm does not know are remembered for `miss_ttl` seconds so they are
+    not looked up again on every request.
+    """
+
+    def __init__(self, path: Optional[str] = None, miss_ttl: float = 86400.0):
+        self.path = path
+        self.miss_ttl = miss_ttl
+        self.hits = 0
+        self.misses = 0
+        self._rxcuis: Dict[str, str] = {}
+        self._unknown: Dict[str, float] = {}
+        self._aliases: Dict[str, str] = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        for generic, drug_info in COMPREHENSIVE_DRUG_DATABASE.items():
+            for brand in drug_info.get('brand_names', []):
+                self._aliases.setdefault(normalise_drug_name(brand), normalise_drug_name(generic))
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def canonical(self, name: str) -> str:
+        """Lookup key for `name`: its generic name if it is a known brand"""
+        key = normalise_drug_name(name)
+        return self._aliases.get(key, key)
+
+    def lookup_many(self, names: Iterable[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        """Resolve `names` from memory.
+
+        Returns the names resolved so far (None for names recently found to
+        be unknown) and the canonical names that still need a network lookup.
+        """
+        resolved, missing = {}, []
+        now = time.time()
+        with self._lock:
+            for name in names:
+                key = self.canonical(name)
+                if key in self._rxcuis:
+                    resolved[name] = self._rxcuis[key]
+                elif now < self._unknown.get(key, 0):
+                    resolved[name] = None
+                else:
+                    missing.append(key)
+            self.hits += len(resolved)
+            self.misses += len(missing)
+        return resolved, list(dict.fromkeys(missing))
+
+    def update(self, found: Dict[str, Optional[str]]):
+        """Record network lookups of canonical names; None marks a name RxNorm does not know"""
+        now = time.time()
+        with self._lock:
+            for key, rxcui in found.items():
+                if rxcui:
+                    self._rxcuis[key] = rxcui
+                    self._unknown.pop(key, None)
+                else:
+                    self._unknown[key] = now + self.miss_ttl
+            self._dirty = self._dirty or bool(found)
+
+    def save(self):
+        """Write the table to `path` if anything changed since the last save"""
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'rxcuis': self._rxcuis, 'unknown': self._unknown}, f)
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable RxCUI table {self.path}: {str(e)}")
+            return
+        with self._lock:
+            self._rxcuis.update(data.get('rxcuis', {}))
+            self._unknown.update(data.get('unknown', {}))
+        logger.info(f"Loaded {len(self._rxcuis)} RxCUIs from {self.path}")
+
+    def __len__(self) -> int:
+        return len(self._rxcuis)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'entries': len(self._rxcuis),
+            'aliases': len(self._aliases),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
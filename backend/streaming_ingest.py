@@ -0,0 +1,164 @@
+import time
+import queue
+import threading
+from typing import List, Dict, Any, Callable, Iterable, Iterator
+from vector_db import MedicineVectorDB
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+class StreamingIngestor:
+    """Bounded-memory ingestion: read -> documents -> chunk -> embed -> index.
+
+    Each stage runs in its own thread and hands batches to the next through
+    a queue holding at most `queue_size` batches, so a slow stage (normally
+    embedding) applies back-pressure all the way to the reader instead of
+    letting records pile up. Memory therefore stays proportional to
+    `batch_size * queue_size` whatever the size of the source; only an
+    untrained IVF/quantized index additionally buffers its first
+    `train_size` vectors. The embedding model releases the GIL, so reading
+    and chunking overlap with encoding.
+    """
+
+    def __init__(self, db: MedicineVectorDB, batch_size: int = 256, queue_size: int = 4,
+                 log_every: int = 50):
+        self.db = db
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.log_every = log_every
+
+    def ingest(self, records: Iterable[Dict[str, Any]],
+               to_documents: Callable[[Dict[str, Any]], List[Dict[str, Any]]],
+               replace: bool = False) -> Dict[str, Any]:
+        """Stream `records` (e.g. normalised medicines) into the database via `to_documents`.
+
+        With `replace`, chunks already stored under a document's ID are
+        deleted just before its new chunks are indexed, so re-ingesting a
+        source updates it instead of duplicating it.
+        """
+        stats = {'records': 0, 'documents': 0, 'chunks': 0, 'embedded_chunks': 0, 'deleted_chunks': 0}
+        stop = threading.Event()
+        errors = []
+
+        def document_batches() -> Iterator[List[Dict[str, Any]]]:
+            batch = []
+            for record in records:
+                stats['records'] += 1
+                batch.extend(to_documents(record))
+                if len(batch) >= self.batch_size:
+                    stats['documents'] += len(batch)
+                    yield batch
+                    batch = []
+            if batch:
+                stats['documents'] += len(batch)
+                yield batch
+
+        def embed(batch):
+            chunks, metadata = batch
+            embeddings, encoded = self.db._encode_chunks(chunks)
+            stats['chunks'] += len(chunks)
+            stats['embedded_chunks'] += encoded
+            return embeddings, chunks, metadata
+
+        documents_queue = queue.Queue(self.queue_size)
+        chunks_queue = queue.Queue(self.queue_size)
+        embedded_queue = queue.Queue(self.queue_size)
+        threads = [
+            threading.Thread(target=self._source, args=(document_batches(), documents_queue, stop, errors), daemon=True),
+            threading.Thread(target=self._transform, args=(self.db._chunk_documents, documents_queue, chunks_queue, stop, errors), daemon=True),
+            threading.Thread(target=self._transform, args=(embed, chunks_queue, embedded_queue, stop, errors), daemon=True)
+        ]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            batches = self._progress(self._drain(embedded_queue, stop), stats, start)
+            if replace:
+                batches = self._replacing(batches, stats)
+            self.db._add_batches(batches)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        if errors:
+            raise errors[0]
+        if replace:
+            self.db._maybe_compact()
+
+        stats['seconds'] = time.perf_counter() - start
+        stats['chunks_per_sec'] = stats['chunks'] / stats['seconds'] if stats['seconds'] > 0 else 0.0
+        logger.info(
+            f"Streamed {stats['records']} records ({stats['documents']} documents, {stats['chunks']} chunks) "
+            f"into vector database in {stats['seconds']:.2f}s ({stats['chunks_per_sec']:.1f} chunks/sec)"
+        )
+        return stats
+
+    def _progress(self, batches: Iterator, stats: Dict[str, Any], start: float) -> Iterator:
+        for count, batch in enumerate(batches, 1):
+            if count % self.log_every == 0:
+                elapsed = time.perf_counter() - start
+                logger.info(
+                    f"Ingested {stats['records']} records, {stats['chunks']} chunks "
+                    f"({stats['chunks'] / elapsed:.1f} chunks/sec)"
+                )
+            yield batch
+
+    def _replacing(self, batches: Iterator, stats: Dict[str, Any]) -> Iterator:
+        """Delete the stored chunks of each batch's documents on the indexing thread, right before it is added"""
+        for batch in batches:
+            doc_ids = list(dict.fromkeys(item['doc_id'] for item in batch[2]))
+            stats['deleted_chunks'] += self.db.delete_documents(doc_ids, compact=False)
+            yield batch
+
+    @staticmethod
+    def _put(outbox: queue.Queue, item: Any, stop: threading.Event) -> bool:
+        """Block until `item` is queued or the pipeline is stopping"""
+        while not stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _drain(inbox: queue.Queue, stop: threading.Event) -> Iterator:
+        while not stop.is_set():
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                return
+            yield item
+
+    @classmethod
+    def _source(cls, items: Iterator, outbox: queue.Queue, stop: threading.Event, errors: List[BaseException]):
+        try:
+            for item in items:
+                if not cls._put(outbox, item, stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            cls._put(outbox, _DONE, stop)
+
+    @classmethod
+    def _transform(cls, work: Callable, inbox: queue.Queue, outbox: queue.Queue,
+                   stop: threading.Event, errors: List[BaseException]):
+        try:
+            for item in cls._drain(inbox, stop):
+                if not cls._put(outbox, work(item), stop):
+                    return
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            cls._put(outbox, _DONE, stop)
@@ -0,0 +1,100 @@
+import json
+from typing import Any, Iterator, Sequence, TextIO
+
+_WHITESPACE = ' \t\n\r'
+
+# Characters that can extend a number, so a number followed by one of them may be cut short
+_NUMBER_CONTINUATION = frozenset('0123456789.eE+-')
+
+class _JSONStream:
+    """A text stream read in fixed-size blocks, decoded one JSON value at a time"""
+
+    def __init__(self, f: TextIO, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self, size: int) -> bool:
+        """Append up to `size` more characters, dropping what has been consumed"""
+        if self.eof:
+            return False
+        data = self.f.read(size)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, without consuming it ('' at end of input)"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer) or not self._fill(self.chunk_size):
+                return self.buffer[self.pos:self.pos + 1]
+
+    def expect(self, char: str):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON stream, found '{found or 'end of input'}'")
+        self.pos += 1
+
+    def decode(self) -> Any:
+        """Decode the next complete JSON value, reading further blocks until it is whole"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number or literal ending exactly at the buffer end may continue in the next block,
+                # and a number decoded from "1." or "2e" is only a prefix of the one being read
+                truncated = end == len(self.buffer) or (
+                    isinstance(value, (int, float)) and not isinstance(value, bool)
+                    and self.buffer[end] in _NUMBER_CONTINUATION
+                )
+                if self.eof or not truncated:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            if not self._fill(size):
+                continue
+            # Large values: read progressively bigger blocks so re-parsing stays linear overall
+            size *= 2
+
+def iter_json_array(f: TextIO, path: Sequence[str] = (), chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Yield the items of a JSON array one at a time without loading the document.
+
+    The array is either the top-level value or, with `path`, found by
+    following those object keys (e.g. ('results',) for openFDA downloads);
+    sibling values met on the way are decoded and discarded. Memory use is
+    bounded by the largest single item, not the file.
+    """
+    stream = _JSONStream(f, chunk_size)
+    for key in path:
+        stream.expect('{')
+        while True:
+            if stream.peek() == '}':
+                raise KeyError(key)
+            name = stream.decode()
+            stream.expect(':')
+            if name == key:
+                break
+            stream.decode()
+            if stream.peek() == ',':
+                stream.expect(',')
+
+    stream.expect('[')
+    if stream.peek() == ']':
+        return
+    while True:
+        yield stream.decode()
+        separator = stream.peek()
+        stream.expect(separator if separator in ',]' else ',')
+        if separator == ']':
+            return
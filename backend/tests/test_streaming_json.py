@@ -0,0 +1,28 @@
+import io
+import os
+import sys
+import json
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pytest
+from streaming_json import iter_json_array
+
+# Scalars that can be cut after a valid prefix ("1." -> 1, "2e" -> 2, "tru")
+ITEMS = [1.5, -0.25, 2e10, 3.5e-7, -4E+2, 10, 0, -7, True, False, None, "1.5", {"a": 1.25e3, "b": [None]}, [6.0, 1e-3]]
+
+@pytest.mark.parametrize('separators', [(',', ':'), (', ', ': ')])
+def test_items_split_at_every_chunk_size(separators):
+    text = json.dumps(ITEMS, separators=separators)
+    for chunk_size in range(1, len(text) + 2):
+        assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == ITEMS, chunk_size
+
+def test_nested_path_split_at_every_chunk_size():
+    text = json.dumps({"meta": {"total": 1.0e2}, "skip": 12.75, "results": ITEMS})
+    for chunk_size in range(1, len(text) + 2):
+        items = iter_json_array(io.StringIO(text), path=('results',), chunk_size=chunk_size)
+        assert list(items) == ITEMS, chunk_size
+
+@pytest.mark.parametrize('text', ['[1.5]', '[2e10]', '[true]', '[null]', '[-3]'])
+def test_single_item_at_end_of_input(text):
+    for chunk_size in range(1, len(text) + 2):
+        assert list(iter_json_array(io.StringIO(text), chunk_size=chunk_size)) == json.loads(text)
@@ -1,123 +1,851 @@
 import os
+import copy
+import json
+import time
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional, Tuple, Union
 import faiss
 import pickle
-from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.schema import Document
+from chunk_store import TextStore, JSONStore, MetadataStore, replace_file, document_id
+from query_cache import LRUCache
+from embedding_cache import EmbeddingCache, text_hash
+from embeddings import create_embedding_backend
+from bm25_index import BM25Index, tokenize, reciprocal_rank_fusion
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+INDEX_TYPES = ('flat', 'ivf_flat', 'ivf_pq', 'hnsw')
+
+# Vector codecs: float16 or 8-bit scalar quantization (2x / 4x smaller) or product quantization
+COMPRESSION_TYPES = ('none', 'fp16', 'sq8', 'pq')
+
+# Retrieval modes: embedding distance, BM25, or reciprocal rank fusion of the two
+SEARCH_MODES = ('vector', 'lexical', 'hybrid')
+
+def index_factory_string(index_type: str, nlist: int = 1024, pq_m: int = 48, hnsw_m: int = 32,
+                         compression: str = 'none') -> str:
+    """Translate an index type and compression mode into a FAISS index_factory description"""
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSION_TYPES}")
+    if index_type == 'ivf_pq':
+        compression = 'pq'
+    codec = {'none': 'Flat', 'fp16': 'SQfp16', 'sq8': 'SQ8', 'pq': f"PQ{pq_m}"}[compression]
+    
+    if index_type == 'flat':
+        return codec
+    if index_type in ('ivf_flat', 'ivf_pq'):
+        return f"IVF{nlist},{codec}"
+    if index_type == 'hnsw':
+        return f"HNSW{hnsw_m}" if compression == 'none' else f"HNSW{hnsw_m}_{codec}"
+    raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+
+def build_faiss_index(index_type: str, dimension: int, train_vectors: Optional[np.ndarray] = None,
+                      nlist: int = 1024, pq_m: int = 48, hnsw_m: int = 32,
+                      compression: str = 'none') -> Tuple[faiss.Index, str, str]:
+    """Build (and train, for IVF and quantized types) a FAISS index of the requested type.
+    
+    Returns the index with the index type and compression it actually uses,
+    which differ from those requested when PQ falls back to SQ8.
+    """
+    uses_pq = index_type == 'ivf_pq' or compression == 'pq'
+    if uses_pq and train_vectors is not None and len(train_vectors) < 256:
+        logger.warning(f"Only {len(train_vectors)} training vectors, too few for PQ codebooks; using SQ8")
+        index_type = 'ivf_flat' if index_type == 'ivf_pq' else index_type
+        compression = 'sq8'
+        
+    if index_type in ('ivf_flat', 'ivf_pq'):
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError(f"Index type '{index_type}' needs training vectors")
+        # FAISS wants ~39 training points per centroid; shrink nlist for small corpora
+        nlist = max(1, min(nlist, len(train_vectors) // 39))
+        
+    description = index_factory_string(index_type, nlist, pq_m, hnsw_m, compression)
+    index = faiss.index_factory(dimension, description, faiss.METRIC_L2)
+    if not index.is_trained:
+        if train_vectors is None or len(train_vectors) == 0:
+            raise ValueError(f"Index '{description}' needs training vectors")
+        index.train(train_vectors)
+    return index, index_type, compression
+
+def _rank_key(result: Dict[str, Any]) -> float:
+    """Sort key of one result: fused score (lexical/hybrid modes) or distance (vector mode)"""
+    return -result['score'] if 'score' in result else result['distance']
+
+def merge_results(result_lists: List[List[Dict[str, Any]]], limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Merge per-query results from one search mode into one list, deduplicated by content and best first"""
+    best = {}
+    for results in result_lists:
+        for result in results:
+            seen = best.get(result['content'])
+            if seen is None or _rank_key(result) < _rank_key(seen):
+                best[result['content']] = result
+                
+    merged = sorted(best.values(), key=_rank_key)
+    return merged[:limit] if limit is not None else merged
+
 class MedicineVectorDB:
-    def __init__(self, embedding_model_name: str = "all-MiniLM-L6-v2"):
-        self.embedding_model = SentenceTransformer(embedding_model_name)
+    def __init__(self, embedding_model_name: str = "all-MiniLM-L6-v2", batch_size: int = 64,
+                 index_type: str = "flat", compression: str = "none", nlist: int = 1024,
+                 pq_m: int = 48, hnsw_m: int = 32,
+                 nprobe: int = 16, ef_search: int = 64, train_size: int = 50000,
+                 filter_scan_limit: int = 4096, query_cache_size: int = 4096,
+                 result_cache_size: int = 1024, cache_ttl: Optional[float] = 3600,
+                 compact_threshold: float = 0.25, embedding_backend: Optional[Any] = None,
+                 rrf_k: int = 60, fusion_depth: int = 4, lexical_fast_path: bool = True,
+                 lexical_max_df: float = 0.05, embedding_cache_path: Optional[str] = None):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type '{index_type}', expected one of {INDEX_TYPES}")
+        if compression not in COMPRESSION_TYPES:
+            raise ValueError(f"Unknown compression '{compression}', expected one of {COMPRESSION_TYPES}")
+            
+        # Anything with `encode(texts, batch_size=...)`; the default backend loads its model on first encode
+        self.embedding_model = embedding_backend or create_embedding_backend(model_name=embedding_model_name)
         self.dimension = 384  # Dimension for all-MiniLM-L6-v2
+        self.batch_size = batch_size
+        
+        # ANN configuration: IVF types and quantized codecs are trained on the first `train_size` ingested vectors
+        self.index_type = index_type
+        self.compression = compression
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.hnsw_m = hnsw_m
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.train_size = train_size
+        
+        # Filtered searches over at most this many rows are scored exactly on their own vectors
+        self.filter_scan_limit = filter_scan_limit
+        
+        # Deleted chunks are tombstoned; the store compacts once they exceed this fraction
+        self.compact_threshold = compact_threshold
+        
+        # Hybrid retrieval: RRF constant, candidates ranked per result, and the BM25-only fast path for
+        # queries whose terms are drug names or occur in at most `lexical_max_df` of the chunks
+        self.rrf_k = rrf_k
+        self.fusion_depth = fusion_depth
+        self.lexical_fast_path = lexical_fast_path
+        self.lexical_max_df = lexical_max_df
+        
         self.index = None
-        self.documents = []
-        self.metadata = []
+        self.documents = TextStore()
+        self.metadata = MetadataStore()
+        self.bm25 = BM25Index()
+        self._name_terms = (0, set())  # (drug names seen, their terms)
+        
+        # Set when the index is a read-only memory map of `_index_path`
+        self._index_path = None
+        self._index_mmapped = False
+        
+        # Query embeddings depend only on the text; cached results are dropped whenever the index changes
+        self.embedding_cache = LRUCache(query_cache_size, cache_ttl)
+        self.result_cache = LRUCache(result_cache_size, cache_ttl)
+        
+        # Chunk embeddings persisted by content hash, so re-ingesting unchanged text skips the model
+        self.chunk_cache = None
+        if embedding_cache_path:
+            model_key = getattr(self.embedding_model, 'cache_key', embedding_model_name)
+            self.chunk_cache = EmbeddingCache(embedding_cache_path, model_key)
+        
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
         )
         
-    def create_index(self):
-        """Create a new FAISS index"""
-        self.index = faiss.IndexFlatL2(self.dimension)
-        logger.info(f"Created FAISS index with dimension {self.dimension}")
+    @property
+    def requires_training(self) -> bool:
+        """Whether the configured index must be trained before vectors are added"""
+        description = index_factory_string(self.index_type, self.nlist, self.pq_m, self.hnsw_m, self.compression)
+        return not faiss.index_factory(self.dimension, description, faiss.METRIC_L2).is_trained
+        
+    def create_index(self, train_vectors: Optional[np.ndarray] = None):
+        """Create a new FAISS index, training it on `train_vectors` for IVF types"""
+        self.index, self.index_type, self.compression = build_faiss_index(
+            self.index_type,
+            self.dimension,
+            train_vectors,
+            nlist=self.nlist,
+            pq_m=self.pq_m,
+            hnsw_m=self.hnsw_m,
+            compression=self.compression
+        )
+        self._prepare_index()
+        logger.info(f"Created {self.index_type} FAISS index ({self.compression} compression) with dimension {self.dimension}")
         
-    def add_documents(self, documents: List[Dict[str, Any]]):
-        """Add documents to the vector database"""
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune query-time recall/latency: nprobe for IVF indexes, efSearch for HNSW"""
         if self.index is None:
-            self.create_index()
+            return
             
+        params = faiss.ParameterSpace()
+        if nprobe is not None and self.index_type in ('ivf_flat', 'ivf_pq'):
+            self.nprobe = nprobe
+            params.set_index_parameter(self.index, 'nprobe', nprobe)
+        if ef_search is not None and self.index_type == 'hnsw':
+            self.ef_search = ef_search
+            params.set_index_parameter(self.index, 'efSearch', ef_search)
+        
+    def _prepare_index(self):
+        """Apply the default search parameters and, for IVF indexes, build the
+        row -> inverted-list direct map that `_reconstruct` needs. Done once
+        whenever the index object is replaced, never while queries run."""
+        self.set_search_params(self.nprobe, self.ef_search)
+        if self.index is not None and self.index_type in ('ivf_flat', 'ivf_pq'):
+            ivf = faiss.extract_index_ivf(self.index)
+            if ivf.direct_map.type == faiss.DirectMap.NoMap:
+                ivf.make_direct_map()
+                
+    def _search_parameters(self, nprobe: Optional[int] = None,
+                           ef_search: Optional[int] = None) -> Optional[faiss.SearchParameters]:
+        """Per-query ANN parameters, so overrides never touch the shared index"""
+        if nprobe is not None and self.index_type in ('ivf_flat', 'ivf_pq'):
+            return faiss.SearchParametersIVF(nprobe=nprobe)
+        if ef_search is not None and self.index_type == 'hnsw':
+            return faiss.SearchParametersHNSW(efSearch=ef_search)
+        return None
+        
+    def _chunk_documents(self, documents: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Split documents into chunks, returning the chunk texts and their metadata"""
+        chunks = []
+        metadata = []
+        
         for doc in documents:
-            # Split document into chunks
             text = doc.get('content', '')
-            chunks = self.text_splitter.split_text(text)
+            doc_chunks = self.text_splitter.split_text(text)
             
-            for i, chunk in enumerate(chunks):
-                # Create embedding
-                embedding = self.embedding_model.encode([chunk])[0]
-                
-                # Add to index
-                self.index.add(np.array([embedding], dtype=np.float32))
-                
-                # Store document and metadata
-                self.documents.append(chunk)
-                self.metadata.append({
+            for i, chunk in enumerate(doc_chunks):
+                chunks.append(chunk)
+                metadata.append({
                     'drug_name': doc.get('drug_name', ''),
                     'source': doc.get('source', ''),
                     'section': doc.get('section', ''),
+                    'doc_id': document_id(doc),
                     'chunk_id': i,
-                    'total_chunks': len(chunks)
+                    'total_chunks': len(doc_chunks)
                 })
                 
-        logger.info(f"Added {len(documents)} documents to vector database")
+        return chunks, metadata
         
-    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts as one contiguous float32 matrix"""
+        embeddings = self.embedding_model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+        
+    def _encode_chunks(self, texts: List[str]) -> Tuple[np.ndarray, int]:
+        """Embed chunk texts, running the model once per distinct text not in the chunk cache.
+        
+        Returns the embeddings and the number of texts the model actually encoded.
+        """
+        hashes = [text_hash(text) for text in texts]
+        unique = list(dict.fromkeys(hashes))
+        vectors = self.chunk_cache.get_many(unique) if self.chunk_cache is not None else {}
+        
+        missing = [digest for digest in unique if digest not in vectors]
+        if missing:
+            text_of = dict(zip(hashes, texts))
+            encoded = self._encode([text_of[digest] for digest in missing])
+            vectors.update(zip(missing, encoded))
+            if self.chunk_cache is not None:
+                self.chunk_cache.put_many(missing, encoded)
+                
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for row, digest in enumerate(hashes):
+            embeddings[row] = vectors[digest]
+        return embeddings, len(missing)
+        
+    def _add_embeddings(self, embeddings: np.ndarray, chunks: List[str], metadata: List[Dict[str, Any]]):
+        """Add embedded chunks, creating (and training) the index on first use"""
+        if self.index is None:
+            self.create_index(train_vectors=embeddings)
+        self._ensure_writable()
+        
+        self.index.add(embeddings)
+        self.documents.extend(chunks)
+        self.metadata.extend(metadata)
+        self.bm25.extend(chunks)
+        self._invalidate_caches()
+        
+    def _add_batches(self, batches: Iterable[Tuple[np.ndarray, List[str], List[Dict[str, Any]]]]):
+        """Add (embeddings, chunks, metadata) batches as they arrive.
+        
+        An untrained IVF/quantized index buffers batches until it has
+        `train_size` vectors to train on; after that each batch is added as
+        one contiguous matrix.
+        """
+        if self.index is None and not self.requires_training:
+            self.create_index()
+            
+        pending = []
+        pending_rows = 0
+        for batch in batches:
+            pending.append(batch)
+            pending_rows += len(batch[1])
+            if self.index is None and pending_rows < self.train_size:
+                continue
+            self._add_pending(pending)
+            pending, pending_rows = [], 0
+        if pending:
+            self._add_pending(pending)
+            
+    def _add_pending(self, pending: List[Tuple[np.ndarray, List[str], List[Dict[str, Any]]]]):
+        if len(pending) == 1:
+            embeddings, chunks, metadata = pending[0]
+        else:
+            embeddings = np.concatenate([batch[0] for batch in pending])
+            chunks = [chunk for batch in pending for chunk in batch[1]]
+            metadata = [item for batch in pending for item in batch[2]]
+        self._add_embeddings(np.ascontiguousarray(embeddings, dtype=np.float32), chunks, metadata)
+        
+    def add_documents(self, documents: List[Dict[str, Any]], batch_size: Optional[int] = None) -> Dict[str, Any]:
+        """Add documents to the vector database in embedding batches"""
+        batch_size = batch_size or self.batch_size
+        chunks, metadata = self._chunk_documents(documents)
+        
+        start = time.perf_counter()
+        embedded = 0
+        
+        def encoded_batches():
+            nonlocal embedded
+            for begin in range(0, len(chunks), batch_size):
+                end = min(begin + batch_size, len(chunks))
+                embeddings, encoded = self._encode_chunks(chunks[begin:end])
+                embedded += encoded
+                yield embeddings, chunks[begin:end], metadata[begin:end]
+                
+        # One contiguous matrix per batch instead of one add per chunk
+        self._add_batches(encoded_batches())
+        
+        elapsed = time.perf_counter() - start
+        throughput = len(chunks) / elapsed if elapsed > 0 else 0.0
+        
+        logger.info(
+            f"Added {len(documents)} documents ({len(chunks)} chunks) to vector database "
+            f"in {elapsed:.2f}s ({throughput:.1f} chunks/sec, {embedded} embedded, "
+            f"{len(chunks) - embedded} reused)"
+        )
+        return {
+            'documents': len(documents),
+            'chunks': len(chunks),
+            'embedded_chunks': embedded,
+            'seconds': elapsed,
+            'chunks_per_sec': throughput
+        }
+        
+    def search(self, query: str, k: int = 5, filters: Optional[Dict[str, Any]] = None,
+               nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+               mode: str = 'vector') -> List[Dict[str, Any]]:
+        """Search for similar documents.
+        
+        `filters` restricts results to chunks whose drug_name/source/section match
+        (a string or list of strings per field, compared case-insensitively). Small
+        filtered subsets, such as one drug's chunks, are scored exactly against just
+        their own vectors; larger ones use an over-fetching ANN search. `nprobe` and
+        `ef_search` override the ANN search parameters for this call.
+        
+        `mode` is 'vector' (embedding distance), 'lexical' (BM25 only) or 'hybrid'
+        (reciprocal rank fusion of both). Hybrid queries made up of drug names or
+        other rare indexed terms, such as "Xanax 0.25mg", skip the embedding model
+        and are answered from BM25 alone. Lexical and hybrid results carry a fused
+        'score' (higher is better) and their 'bm25' score; 'distance' is None for
+        chunks the vector search did not return.
+        """
         if self.index is None or self.index.ntotal == 0:
             logger.warning("Vector database is empty")
             return []
             
-        # Create query embedding
-        query_embedding = self.embedding_model.encode([query])[0]
+        key = self._result_key(query, k, filters, nprobe, ef_search, mode=mode)
+        results = self.result_cache.get(key)
+        if results is None:
+            results = self._search_queries([query], [k], [filters], mode, nprobe=nprobe, ef_search=ef_search)[0]
+            self.result_cache.put(key, results)
+        return list(results)
+        
+    def search_many(self, queries: List[str], k: Union[int, List[int]] = 5,
+                    filters: Optional[List[Optional[Dict[str, Any]]]] = None,
+                    unfiltered_fallback: bool = False, mode: str = 'vector') -> List[List[Dict[str, Any]]]:
+        """Search several queries with one embedding call and one FAISS search.
+        
+        `k` and `filters` may be given per query. All unfiltered queries are
+        answered by a single search with a query matrix; filtered ones reuse
+        their precomputed embedding. With `unfiltered_fallback`, a filtered query
+        that matches nothing is retried without its filters. `mode` is as for
+        `search`. Returns one result list per query, in order; see
+        `merge_results` to combine them.
+        """
+        if not queries:
+            return []
+        if self.index is None or self.index.ntotal == 0:
+            logger.warning("Vector database is empty")
+            return [[] for _ in queries]
+            
+        ks = [k] * len(queries) if isinstance(k, int) else list(k)
+        filters = filters or [None] * len(queries)
+        keys = [self._result_key(q, ks[i], filters[i], fallback=unfiltered_fallback, mode=mode) for i, q in enumerate(queries)]
+        results = [self.result_cache.get(key) for key in keys]
+        pending = [i for i, cached in enumerate(results) if cached is None]
+        
+        if pending:
+            found = self._search_queries(
+                [queries[i] for i in pending],
+                [ks[i] for i in pending],
+                [filters[i] for i in pending],
+                mode,
+                fallback=unfiltered_fallback
+            )
+            for i, hits in zip(pending, found):
+                results[i] = hits
+                self.result_cache.put(keys[i], hits)
+                
+        return [list(r) for r in results]
+        
+    def _search_queries(self, queries: List[str], ks: List[int], filters: List[Optional[Dict[str, Any]]],
+                        mode: str, fallback: bool = False, nprobe: Optional[int] = None,
+                        ef_search: Optional[int] = None) -> List[List[Dict[str, Any]]]:
+        """Uncached search of several queries; the embedding model runs once, for the queries that need vectors"""
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+            
+        # Row scope per query: None searches every live row
+        scopes = []
+        for query_filters in filters:
+            rows = self.metadata.rows_matching(query_filters) if query_filters else None
+            if rows is not None and len(rows) == 0 and fallback:
+                rows = None
+            scopes.append(rows)
+            
+        # Fused modes rank deeper candidate lists than they return
+        depths = ks if mode == 'vector' else [k * self.fusion_depth for k in ks]
+        lexical = [None] * len(queries)
+        if mode != 'vector':
+            lexical = [self._lexical_hits(q, depths[i], scopes[i]) for i, q in enumerate(queries)]
+            
+        wanted = [
+            i for i, q in enumerate(queries)
+            if mode == 'vector' or (mode == 'hybrid' and not (
+                self.lexical_fast_path and len(lexical[i][1]) and self._is_name_query(q)
+            ))
+        ]
+        vector = [None] * len(queries)
+        if wanted:
+            embeddings = self._encode_queries([queries[i] for i in wanted])
+            unfiltered = []
+            for position, i in enumerate(wanted):
+                if scopes[i] is None:
+                    unfiltered.append(position)
+                else:
+                    vector[i] = self._search_scope(embeddings[position:position + 1], depths[i], scopes[i], nprobe, ef_search)
+                    
+            if unfiltered:
+                distances, indices = self._search_live(
+                    embeddings[unfiltered],
+                    max(depths[wanted[position]] for position in unfiltered),
+                    nprobe=nprobe,
+                    ef_search=ef_search
+                )
+                for row, position in enumerate(unfiltered):
+                    i = wanted[position]
+                    vector[i] = (distances[row][:depths[i]], indices[row][:depths[i]])
+                    
+        return [self._rank_hits(ks[i], mode, vector[i], lexical[i]) for i in range(len(queries))]
+        
+    def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed query strings, running the model only for texts not in the embedding cache"""
+        vectors = [self.embedding_cache.get(query) for query in queries]
+        missing = list(dict.fromkeys(q for q, v in zip(queries, vectors) if v is None))
+        
+        if missing:
+            encoded = dict(zip(missing, self._encode(missing)))
+            for query, vector in encoded.items():
+                self.embedding_cache.put(query, vector)
+            vectors = [encoded[q] if v is None else v for q, v in zip(queries, vectors)]
+            
+        return np.ascontiguousarray(np.vstack(vectors), dtype=np.float32)
+        
+    @staticmethod
+    def _result_key(query: str, k: int, filters: Optional[Dict[str, Any]] = None,
+                    nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                    fallback: bool = False, mode: str = 'vector') -> Tuple:
+        """Hashable result-cache key for one search"""
+        frozen_filters = tuple(sorted(
+            (name, value if isinstance(value, str) else tuple(value))
+            for name, value in (filters or {}).items()
+        ))
+        return (query, k, frozen_filters, nprobe, ef_search, fallback, mode)
+        
+    def _invalidate_caches(self):
+        """Forget cached search results after the index or its rows change"""
+        self.result_cache.clear()
+        
+    def _search_scope(self, query_embedding: np.ndarray, k: int, rows: np.ndarray,
+                      nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Vector (distances, indices) of a (1, dimension) query among the live `rows`"""
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        if len(rows) <= self.filter_scan_limit:
+            distances, indices = self._search_rows(query_embedding, rows, k)
+        else:
+            allowed = np.zeros(self.index.ntotal, dtype=bool)
+            allowed[rows] = True
+            distances, indices = self._search_live(query_embedding, k, allowed, nprobe, ef_search)
+        return distances[0], indices[0]
+        
+    def _lexical_hits(self, query: str, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """BM25 (scores, rows) among the live `rows`, or among all live rows"""
+        exclude = self.metadata.deleted_rows() if rows is None and self.metadata.deleted else None
+        return self.bm25.search(query, k, rows=rows, exclude=exclude)
+        
+    def _is_name_query(self, query: str) -> bool:
+        """Whether every query term is part of a drug name or a rare indexed term (brand, dose string)"""
+        terms = tokenize(query)
+        if not terms or len(terms) > 4:
+            return False
+        names = self._drug_name_terms()
+        rare = self.lexical_max_df * len(self.bm25)
+        return all(term in names or 0 < self.bm25.document_frequency(term) <= rare for term in terms)
         
-        # Search in FAISS
-        distances, indices = self.index.search(
-            np.array([query_embedding], dtype=np.float32), k
+    def drug_names(self) -> List[str]:
+        """Distinct drug names stored in the database"""
+        return list(self.metadata.tables['drug_name'].values)
+        
+    def _drug_name_terms(self) -> set:
+        table = self.metadata.tables['drug_name']
+        if self._name_terms[0] != len(table):
+            self._name_terms = (len(table), {term for name in table.values for term in tokenize(name)})
+        return self._name_terms[1]
+        
+    def _rank_hits(self, k: int, mode: str, vector: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                   lexical: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> List[Dict[str, Any]]:
+        """Result dicts for one query from its vector and/or BM25 hits"""
+        if mode == 'vector':
+            return self._format_results(*vector)
+            
+        bm25_scores, bm25_rows = lexical
+        rankings = [bm25_rows] if vector is None else [vector[1], bm25_rows]
+        rows, scores = reciprocal_rank_fusion(rankings, k, self.rrf_k)
+        
+        distance_of = {} if vector is None else dict(zip(vector[1].tolist(), vector[0].tolist()))
+        bm25_of = dict(zip(bm25_rows.tolist(), bm25_scores.tolist()))
+        return [
+            {
+                'content': self.documents[row],
+                'metadata': self.metadata[row],
+                'distance': distance_of.get(row),
+                'score': score,
+                'bm25': bm25_of.get(row, 0.0)
+            }
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+        
+    def _search_index(self, query_embeddings: np.ndarray, k: int, nprobe: Optional[int] = None,
+                      ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search in FAISS, overriding the ANN parameters for this call only if asked"""
+        params = self._search_parameters(nprobe, ef_search)
+        if params is None:
+            return self.index.search(query_embeddings, k)
+        return self.index.search(query_embeddings, k, params=params)
+            
+    def _search_rows(self, query_embeddings: np.ndarray, rows: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact L2 search restricted to `rows`, reading only those rows' vectors"""
+        vectors = self._reconstruct(rows)
+        distances = (
+            (query_embeddings ** 2).sum(axis=1, keepdims=True)
+            + (vectors ** 2).sum(axis=1)
+            - 2 * query_embeddings @ vectors.T
         )
+        order = np.argsort(distances, axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), rows[order]
+        
+    def _search_live(self, query_embeddings: np.ndarray, k: int, allowed: Optional[np.ndarray] = None,
+                     nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """ANN search that skips tombstoned rows and rows outside the `allowed` mask.
         
-        # Prepare results
+        Over-fetches (growing 4x per round) until every query has k admissible
+        hits or the whole index has been returned. Missing hits are padded with -1.
+        """
+        if self.metadata.deleted:
+            if allowed is None:
+                allowed = np.ones(self.index.ntotal, dtype=bool)
+            allowed[self.metadata.deleted_rows()] = False
+        if allowed is None:
+            return self._search_index(query_embeddings, k, nprobe, ef_search)
+            
+        fetch = k * 4
+        while True:
+            fetch = min(fetch, self.index.ntotal)
+            distances, indices = self._search_index(query_embeddings, fetch, nprobe, ef_search)
+            keep = (indices >= 0) & allowed[np.maximum(indices, 0)]
+            if (keep.sum(axis=1) >= k).all() or fetch == self.index.ntotal:
+                break
+            fetch *= 4
+            
+        kept_distances = np.full((len(query_embeddings), k), np.inf, dtype=np.float32)
+        kept_indices = np.full((len(query_embeddings), k), -1, dtype=np.int64)
+        for i in range(len(query_embeddings)):
+            hits = np.flatnonzero(keep[i])[:k]
+            kept_distances[i, :len(hits)] = distances[i, hits]
+            kept_indices[i, :len(hits)] = indices[i, hits]
+        return kept_distances, kept_indices
+        
+    def _reconstruct(self, rows: np.ndarray) -> np.ndarray:
+        """Stored (for PQ, decoded) vectors of the given rows (IVF direct map built by `_prepare_index`)"""
+        return self.index.reconstruct_batch(rows)
+            
+    def _format_results(self, distances: np.ndarray, indices: np.ndarray) -> List[Dict[str, Any]]:
+        """Turn one query's FAISS hits into result dicts"""
         results = []
-        for i, idx in enumerate(indices[0]):
+        for i, idx in enumerate(indices):
             if idx != -1:  # Valid result
                 results.append({
                     'content': self.documents[idx],
                     'metadata': self.metadata[idx],
-                    'distance': float(distances[0][i])
+                    'distance': float(distances[i])
                 })
                 
         return results
         
+    def upsert_documents(self, documents: List[Dict[str, Any]], replace_drugs: bool = False) -> Dict[str, Any]:
+        """Insert documents, replacing any already stored under the same document ID.
+        
+        Document IDs come from each document's `doc_id`, defaulting to
+        source:drug_name:section. With `replace_drugs`, every existing chunk of
+        each document's (drug_name, source) is removed first, so sections that
+        disappeared from a refreshed label go too. Only the given documents
+        are embedded.
+        """
+        if replace_drugs:
+            deleted = 0
+            for drug_name, source in dict.fromkeys((d.get('drug_name', ''), d.get('source', '')) for d in documents):
+                deleted += self.delete_by_drug(drug_name, source=source, compact=False)
+        else:
+            deleted = self.delete_documents([document_id(d) for d in documents], compact=False)
+            
+        stats = self.add_documents(documents)
+        stats['deleted_chunks'] = deleted
+        self._maybe_compact()
+        return stats
+        
+    def delete_documents(self, doc_ids: List[str], compact: bool = True) -> int:
+        """Delete every chunk of the given document IDs, returning the number of chunks removed"""
+        rows = self.metadata.rows_matching({'doc_id': doc_ids}) if doc_ids else []
+        return self._delete_rows(rows, compact)
+        
+    def delete_by_drug(self, drug_name: str, source: Optional[str] = None, compact: bool = True) -> int:
+        """Delete every chunk of a drug (optionally only from one source), returning the number removed"""
+        filters = {'drug_name': drug_name}
+        if source is not None:
+            filters['source'] = source
+        return self._delete_rows(self.metadata.rows_matching(filters), compact)
+        
+    def _delete_rows(self, rows, compact: bool) -> int:
+        deleted = self.metadata.delete_rows(rows)
+        if deleted:
+            self._invalidate_caches()
+            logger.info(f"Deleted {deleted} chunks from vector database")
+            if compact:
+                self._maybe_compact()
+        return deleted
+        
+    def _maybe_compact(self):
+        if len(self.metadata) and len(self.metadata.deleted) / len(self.metadata) > self.compact_threshold:
+            self.compact()
+            
+    def compact(self, batch_size: int = 65536) -> int:
+        """Drop tombstoned chunks, rebuilding the index from its stored vectors (no re-embedding).
+        
+        Live rows keep their relative order but are renumbered; document IDs
+        are unaffected. Returns the number of chunks dropped.
+        """
+        dropped = len(self.metadata.deleted)
+        if not dropped:
+            return 0
+            
+        start = time.perf_counter()
+        self._ensure_writable()
+        live = self.metadata.live_rows()
+        
+        # Same (already trained) index type, emptied and refilled with the live vectors
+        index = faiss.clone_index(self.index)
+        index.reset()
+        for begin in range(0, len(live), batch_size):
+            index.add(np.ascontiguousarray(self._reconstruct(live[begin:begin + batch_size]), dtype=np.float32))
+            
+        documents = TextStore.from_values(self.documents[row] for row in live)
+        metadata = MetadataStore.from_values(self.metadata[row] for row in live)
+        self.bm25 = self.bm25.select(live)
+        self.index, self.documents, self.metadata = index, documents, metadata
+        self._name_terms = (0, set())
+        self._prepare_index()
+        self._invalidate_caches()
+        
+        logger.info(f"Compacted vector database: dropped {dropped} chunks in {time.perf_counter() - start:.2f}s")
+        return dropped
+        
+    def _ensure_writable(self):
+        """Swap a memory-mapped, read-only index for an in-memory copy before mutating it"""
+        if self._index_mmapped:
+            self.index = faiss.read_index(self._index_path)
+            self._index_mmapped = False
+            self._prepare_index()
+            logger.info("Loaded writable copy of memory-mapped FAISS index")
+            
     def save(self, path: str):
-        """Save the vector database to disk"""
+        """Save the vector database to disk in the memory-mappable format.
+        
+        Writes `{path}.index` (FAISS), `{path}.chunks.*` (offset-indexed chunk
+        texts), `{path}.meta.*` (metadata columns), `{path}.bm25.*` (BM25
+        postings) and `{path}.json` (index settings). Every file is swapped in atomically, so processes serving a
+        mapped copy are unaffected.
+        """
         os.makedirs(os.path.dirname(path), exist_ok=True)
         
         # Save FAISS index
-        faiss.write_index(self.index, f"{path}.index")
+        faiss.write_index(self.index, f"{path}.index.tmp")
+        os.replace(f"{path}.index.tmp", f"{path}.index")
         
         # Save documents and metadata
-        with open(f"{path}.pkl", 'wb') as f:
-            pickle.dump({
-                'documents': self.documents,
-                'metadata': self.metadata
-            }, f)
+        self.documents.save(f"{path}.chunks")
+        self.metadata.save(f"{path}.meta")
+        self.bm25.save(f"{path}.bm25")
+        replace_file(f"{path}.json", lambda f: f.write(json.dumps({
+            'format_version': 3,
+            'total_documents': len(self.documents),
+            'config': self._index_config()
+        }, indent=2).encode('utf-8')))
             
         logger.info(f"Saved vector database to {path}")
         
-    def load(self, path: str):
-        """Load the vector database from disk"""
-        # Load FAISS index
-        self.index = faiss.read_index(f"{path}.index")
+    def load(self, path: str, mmap: bool = True):
+        """Load the vector database from disk.
+        
+        With `mmap` the FAISS index and the chunk/metadata records are memory-mapped
+        rather than read into RAM; rows are decoded only when `search` returns them.
+        Stores saved in the older `.pkl` format are still read eagerly.
+        """
+        start = time.perf_counter()
         
+        # Load FAISS index
+        self._index_path = f"{path}.index"
+        self._index_mmapped = False
+        if mmap:
+            # IO_FLAG_MMAP_IFC (newer FAISS) extends mmap from IVF lists to flat/SQ/PQ codes,
+            # but IVF indexes only accept the plain flag
+            mmap_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            for flags in (mmap_flags | getattr(faiss, 'IO_FLAG_MMAP_IFC', 0), mmap_flags):
+                try:
+                    self.index = faiss.read_index(self._index_path, flags)
+                    self._index_mmapped = True
+                    break
+                except RuntimeError as e:
+                    error = e
+            else:
+                logger.warning(f"Could not memory-map FAISS index, reading it into memory: {str(error)}")
+        if not self._index_mmapped:
+            self.index = faiss.read_index(self._index_path)
+            
         # Load documents and metadata
-        with open(f"{path}.pkl", 'rb') as f:
-            data = pickle.load(f)
-            self.documents = data['documents']
-            self.metadata = data['metadata']
+        if os.path.exists(f"{path}.json"):
+            with open(f"{path}.json", 'r') as f:
+                store_info = json.load(f)
+            config = store_info['config']
+            
+            self.documents = TextStore.load(f"{path}.chunks")
+            if not mmap:
+                self.documents = TextStore.from_values(self.documents)
+                
+            # Version 2 stores kept metadata as JSON records rather than columns
+            if store_info['format_version'] >= 3:
+                self.metadata = MetadataStore.load(f"{path}.meta")
+            else:
+                self.metadata = MetadataStore.from_values(JSONStore.load(f"{path}.meta"))
+            if not mmap:
+                self.metadata = MetadataStore.from_values(self.metadata)
+        else:
+            with open(f"{path}.pkl", 'rb') as f:
+                data = pickle.load(f)
+            self.documents = TextStore.from_values(data['documents'])
+            self.metadata = MetadataStore.from_values(data['metadata'])
             
-        logger.info(f"Loaded vector database from {path}")
+            # Older stores carry no config and were always flat
+            config = data.get('config', {'index_type': 'flat'})
+            
+        # Stores saved before compression modes existed are uncompressed
+        config.setdefault('compression', 'none')
+        
+        # Stores saved before BM25 existed get their postings built once from the chunk texts
+        if BM25Index.exists(f"{path}.bm25"):
+            self.bm25 = BM25Index.load(f"{path}.bm25", mmap=mmap)
+        else:
+            logger.info("No BM25 postings found, indexing chunk texts")
+            self.bm25 = BM25Index.from_texts(self.documents)
+        self._name_terms = (0, set())
+        
+        self._apply_index_config(config)
+        self._prepare_index()
+        self._invalidate_caches()
         
+        logger.info(f"Loaded vector database from {path} in {time.perf_counter() - start:.3f}s (mmap={self._index_mmapped})")
+        
+    def reopen(self, path: Optional[str] = None) -> 'MedicineVectorDB':
+        """A separate database with these settings, loaded from `path` (empty if None).
+        
+        The embedding model and the query/chunk embedding caches are shared,
+        since they depend only on text. Writers update the copy and then
+        publish it with a single reference assignment, so threads still
+        searching this instance never see it change underneath them.
+        """
+        other = copy.copy(self)
+        other.result_cache = LRUCache(self.result_cache.maxsize, self.result_cache.ttl)
+        other.index = None
+        other.documents = TextStore()
+        other.metadata = MetadataStore()
+        other.bm25 = BM25Index()
+        other._name_terms = (0, set())
+        other._index_path = None
+        other._index_mmapped = False
+        if path is not None:
+            other.load(path)
+        return other
+        
+    def _index_config(self) -> Dict[str, Any]:
+        """Index settings persisted alongside the FAISS index"""
+        return {
+            'index_type': self.index_type,
+            'compression': self.compression,
+            'nlist': self.nlist,
+            'pq_m': self.pq_m,
+            'hnsw_m': self.hnsw_m,
+            'nprobe': self.nprobe,
+            'ef_search': self.ef_search
+        }
+        
+    def _apply_index_config(self, config: Dict[str, Any]):
+        """Restore index settings saved by `_index_config`"""
+        for key, value in config.items():
+            setattr(self, key, value)
+            
     def get_stats(self) -> Dict[str, Any]:
         """Get statistics about the vector database"""
         return {
-            'total_documents': len(self.documents),
+            'total_documents': self.metadata.live_count,
+            'deleted_documents': len(self.metadata.deleted),
             'total_vectors': self.index.ntotal if self.index else 0,
             'dimension': self.dimension,
-            'unique_drugs': len(set(m['drug_name'] for m in self.metadata))
+            'index_type': self.index_type,
+            'compression': self.compression,
+            'unique_drugs': self.metadata.unique_drugs,
+            'lexical_terms': len(self.bm25.terms),
+            'query_cache': {
+                'embeddings': self.embedding_cache.stats(),
+                'results': self.result_cache.stats()
+            },
+            'chunk_embedding_cache': self.chunk_cache.stats() if self.chunk_cache is not None else None
         }
\ No newline at end of file
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Compare the rule-based query classifier with the LLM classifier on a labelled query set
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import argparse
+import time
+import logging
+from query_classifier import QueryClassifier
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# (query, expected drugs as named in the query, expected query type)
+LABELLED_QUERIES = [
+    ("Can I take ibuprofen with amoxicillin?", ["ibuprofen", "amoxicillin"], "interaction"),
+    ("Is it safe to combine aspirin and warfarin?", ["aspirin", "warfarin"], "interaction"),
+    ("Drug interactions between metformin and lisinopril", ["metformin", "lisinopril"], "interaction"),
+    ("Can I drink alcohol while taking Xanax?", ["xanax"], "warnings"),
+    ("Does sertraline interact with tramadol?", ["sertraline", "tramadol"], "interaction"),
+    ("Taking Zoloft and Prozac together", ["zoloft", "prozac"], "interaction"),
+    ("What are the side effects of metformin?", ["metformin"], "side_effects"),
+    ("Gabapentin side effects", ["gabapentin"], "side_effects"),
+    ("Common reactions to prednisone", ["prednisone"], "side_effects"),
+    ("Does omeprazole cause headaches?", ["omeprazole"], "side_effects"),
+    ("adverse effects of amlodipine", ["amlodipine"], "side_effects"),
+    ("Can fluoxetine cause weight gain", ["fluoxetine"], "side_effects"),
+    ("What is lisinopril used for?", ["lisinopril"], "usage"),
+    ("What does levothyroxine treat?", ["levothyroxine"], "usage"),
+    ("How does montelukast work?", ["montelukast"], "usage"),
+    ("Uses of pantoprazole", ["pantoprazole"], "usage"),
+    ("Is amoxicillin good for a sore throat?", ["amoxicillin"], "usage"),
+    ("What is Dolo 650 used for", ["dolo 650"], "usage"),
+    ("What is Combiflam used for?", ["combiflam"], "usage"),
+    ("Zen 200 side effects", ["zen"], "side_effects"),
+    ("How much ibuprofen can I take in a day?", ["ibuprofen"], "dosage"),
+    ("What is the normal dose of metformin?", ["metformin"], "dosage"),
+    ("Amoxicillin dosage for adults", ["amoxicillin"], "dosage"),
+    ("I missed a dose of levothyroxine, what should I do?", ["levothyroxine"], "dosage"),
+    ("How often should I take prednisone 20 mg?", ["prednisone"], "dosage"),
+    ("Maximum daily dose of acetaminophen", ["acetaminophen"], "dosage"),
+    ("Is sertraline safe during pregnancy?", ["sertraline"], "warnings"),
+    ("Warnings for alprazolam", ["alprazolam"], "warnings"),
+    ("Who should avoid losartan?", ["losartan"], "warnings"),
+    ("Can I take metoprolol while breastfeeding?", ["metoprolol"], "warnings"),
+    ("What happens if you overdose on tramadol?", ["tramadol"], "warnings"),
+    ("Precautions for furosemide", ["furosemide"], "warnings"),
+    ("Tell me about simvastatin", ["simvastatin"], "general"),
+    ("simvastatin", ["simvastatin"], "general"),
+    ("What medicines are available for anxiety?", [], "general"),
+    ("Tell me about Crocin", ["crocin"], "general"),
+    ("Is there a generic for Lipitor?", ["lipitor"], "general"),
+    ("hello", [], "general"),
+    ("Can I take Tylenol with Advil?", ["tylenol", "advil"], "interaction"),
+    ("Why do I feel dizzy on amlodipine?", ["amlodipine"], "side_effects"),
+    ("Best time of day to take levothyroxine", ["levothyroxine"], "dosage"),
+    ("What should I know before starting warfarin?", ["warfarin"], "warnings"),
+    ("Can children take ibuprofen?", ["ibuprofen"], "warnings"),
+    ("Is Crocin the same as paracetamol?", ["crocin", "paracetamol"], "general"),
+    ("How do I stay zen while taking sertraline?", ["sertraline"], "general"),
+]
+
+def agreement(predictions, expected):
+    """Share of queries with the expected query type, and with exactly the expected drugs"""
+    intents = sum(p['query_type'] == e[2] for p, e in zip(predictions, expected)) / len(expected)
+    drugs = sum(
+        sorted(d.lower() for d in p.get('drugs', [])) == sorted(e[1]) for p, e in zip(predictions, expected)
+    ) / len(expected)
+    return intents, drugs
+
+def timed(classify, queries):
+    start = time.perf_counter()
+    predictions = [classify(query) for query in queries]
+    return predictions, (time.perf_counter() - start) / len(queries)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--llm', action='store_true', help='Also run the LLM classifier (needs OPENAI_API_KEY)')
+    parser.add_argument('--threshold', type=float, default=0.6, help='Confidence below which the LLM is asked')
+    parser.add_argument('--repeat', type=int, default=200, help='Rule-based passes over the set, for timing')
+    parser.add_argument('--verbose', action='store_true', help='Print every disagreement with the labels')
+    args = parser.parse_args()
+
+    queries = [query for query, _, _ in LABELLED_QUERIES]
+    classifier = QueryClassifier()
+    rules, per_query = timed(classifier.classify, queries * args.repeat)
+    rules = rules[:len(queries)]
+
+    print(f"{'classifier':<22} {'intent acc':>10} {'drug acc':>9} {'ms/query':>10} {'llm calls':>10}")
+    intents, drugs = agreement(rules, LABELLED_QUERIES)
+    print(f"{'rules':<22} {intents:>10.1%} {drugs:>9.1%} {per_query * 1000:>10.4f} {0:>10}")
+
+    confident = [(p, e) for p, e in zip(rules, LABELLED_QUERIES) if p['confidence'] >= args.threshold]
+    if confident:
+        intents, drugs = agreement(*zip(*confident))
+        print(f"{'rules, confident only':<22} {intents:>10.1%} {drugs:>9.1%} {'':>10} "
+              f"{len(queries) - len(confident):>10}  ({len(confident)}/{len(queries)} answered locally)")
+
+    if args.verbose:
+        for prediction, (query, expected_drugs, expected_type) in zip(rules, LABELLED_QUERIES):
+            if prediction['query_type'] != expected_type or sorted(prediction['drugs']) != sorted(expected_drugs):
+                print(f"  {query!r}: {prediction} expected {expected_drugs} {expected_type}")
+
+    if not args.llm:
+        return
+
+    from rag_pipeline import MedicineRAGPipeline
+    pipeline = MedicineRAGPipeline(classifier_threshold=args.threshold)
+    llm, llm_per_query = timed(pipeline.classify_query_with_llm, queries)
+    hybrid, hybrid_per_query = timed(pipeline.classify_query, queries)
+    llm_calls = sum(prediction['confidence'] < args.threshold for prediction in rules)
+
+    intents, drugs = agreement(llm, LABELLED_QUERIES)
+    print(f"{'llm':<22} {intents:>10.1%} {drugs:>9.1%} {llm_per_query * 1000:>10.1f} {len(queries):>10}")
+    intents, drugs = agreement(hybrid, LABELLED_QUERIES)
+    print(f"{f'rules + llm < {args.threshold}':<22} {intents:>10.1%} {drugs:>9.1%} {hybrid_per_query * 1000:>10.1f} {llm_calls:>10}")
+
+    same_intent = sum(r['query_type'] == l['query_type'] for r, l in zip(rules, llm)) / len(queries)
+    print(f"rules/llm intent agreement: {same_intent:.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark sequential vs concurrent FDA label fetching against a local stub openFDA server
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import argparse
+import json
+import random
+import threading
+import time
+import logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from data_fetcher import FDADataFetcher, COMMON_DRUGS
+
+logging.basicConfig(level=logging.WARNING)
+logging.getLogger('data_fetcher').setLevel(logging.ERROR)
+logger = logging.getLogger(__name__)
+
+def stub_handler(latency: float, throttle_rate: float):
+    """Request handler answering label searches after `latency` seconds, throttling a fraction with 429"""
+    rng = random.Random(0)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            time.sleep(latency)
+            with lock:
+                throttled = rng.random() < throttle_rate
+            if throttled:
+                body = b'{"error": {"code": "OVER_RATE_LIMIT"}}'
+                self.send_response(429)
+                self.send_header('Retry-After', '0')
+            else:
+                body = json.dumps({'results': [{
+                    'openfda': {'brand_name': ['Stub'], 'generic_name': ['stub'], 'manufacturer_name': ['Stub Labs']},
+                    'indications_and_usage': ['Stub indication.']
+                }]}).encode()
+                self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+def sequential_fetch(fetcher: FDADataFetcher, drugs):
+    """The original behaviour: one request at a time with a fixed 0.5s pause"""
+    results = []
+    for drug in drugs:
+        results.extend(fetcher.search_drug_label(drug, limit=1))
+        time.sleep(0.5)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--drugs', type=int, default=len(COMMON_DRUGS), help='Number of label lookups')
+    parser.add_argument('--latency', type=float, default=0.15, help='Stub server response time in seconds')
+    parser.add_argument('--throttle-rate', type=float, default=0.1, help='Fraction of requests answered with 429')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=240, help='Token bucket limit in requests per minute')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_handler(args.latency, args.throttle_rate))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/drug"
+    drugs = [COMMON_DRUGS[i % len(COMMON_DRUGS)] for i in range(args.drugs)]
+
+    try:
+        print(f"{'fetcher':<24} {'labels':>7} {'seconds':>8}")
+        for label, run in [
+            ('sequential + sleep(0.5)', lambda f: sequential_fetch(f, drugs)),
+            (f'concurrent ({args.workers} workers)', lambda f: f.fetch_drug_labels(drugs)),
+        ]:
+            fetcher = FDADataFetcher(base_url=base_url, max_workers=args.workers, backoff=0.05,
+                                     fda_requests_per_minute=args.rate)
+            start = time.perf_counter()
+            results = run(fetcher)
+            print(f"{label:<24} {len(results):>7} {time.perf_counter() - start:>8.2f}")
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
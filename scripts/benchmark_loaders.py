@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Indian medicine dataset loaders on synthetic dumps
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import argparse
+import json
+import random
+import tempfile
+import time
+import logging
+import pandas as pd
+from indian_data_fetcher import IndianMedicineDataFetcher
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+def synthetic_rows(rows: int, seed: int = 0):
+    """Kaggle-shaped rows with some nulls, currency-formatted prices and unused columns"""
+    rng = random.Random(seed)
+    salts = ['Paracetamol (500mg)', 'Amoxycillin (250mg)', 'Azithromycin (500mg)', 'Pantoprazole (40mg)']
+    for i in range(rows):
+        yield {
+            'id': i,
+            'name': f"Medicine {i} Tablet",
+            'manufacturer': rng.choice(['Cipla Ltd', 'Sun Pharma', 'Mankind Pharma', '']),
+            'composition': rng.choice(salts),
+            'uses': rng.choice(['Pain relief', 'Bacterial infections', 'Acid reflux', None]),
+            'side_effects': rng.choice(['Nausea Headache', 'Diarrhea', None]),
+            'price': rng.choice([f"₹{rng.uniform(5, 2000):,.2f}", f"{rng.uniform(5, 500):.2f}", None]),
+            'pack_size_label': 'strip of 10 tablets',
+            'is_discontinued': rng.choice(['FALSE', 'TRUE'])
+        }
+
+def legacy_kaggle_loader(file_path: str):
+    """The original loader: full read, then iterrows with per-row get"""
+    df = pd.read_csv(file_path)
+    medicines = []
+    for _, row in df.iterrows():
+        medicines.append({
+            'name': row.get('name', ''),
+            'manufacturer': row.get('manufacturer', ''),
+            'composition': row.get('composition', ''),
+            'uses': row.get('uses', ''),
+            'side_effects': row.get('side_effects', ''),
+            'price': row.get('price', ''),
+            'source': 'Kaggle Indian Medicine Dataset'
+        })
+    return medicines
+
+def legacy_github_loader(file_path: str):
+    """The original loader: json.load, then a per-item loop"""
+    with open(file_path, 'r') as f:
+        data = json.load(f)
+    return [
+        {
+            'name': medicine.get('brand_name', ''),
+            'generic_name': medicine.get('generic_name', ''),
+            'manufacturer': medicine.get('manufacturer', ''),
+            'composition': medicine.get('composition', ''),
+            'category': medicine.get('category', ''),
+            'price': medicine.get('price', ''),
+            'source': 'GitHub Indian Medicine Dataset'
+        }
+        for medicine in data
+    ]
+
+def timed(label: str, loader, rows: int):
+    start = time.perf_counter()
+    count = sum(1 for _ in loader())
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {count:>8} {elapsed:>8.2f} {rows / elapsed:>12.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=250000)
+    args = parser.parse_args()
+
+    fetcher = IndianMedicineDataFetcher()
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'kaggle.csv')
+        json_path = os.path.join(directory, 'github.json')
+        rows = list(synthetic_rows(args.rows))
+        pd.DataFrame(rows).to_csv(csv_path, index=False)
+        with open(json_path, 'w') as f:
+            json.dump([dict(row, brand_name=row['name'], generic_name=row['composition'], category='Tablet')
+                       for row in rows], f)
+        del rows
+
+        print(f"{'loader':<34} {'rows':>8} {'seconds':>8} {'rows/sec':>12}")
+        timed('kaggle legacy (iterrows)', lambda: legacy_kaggle_loader(csv_path), args.rows)
+        timed('kaggle load_kaggle_dataset', lambda: fetcher.load_kaggle_dataset(csv_path), args.rows)
+        timed('kaggle iter_kaggle_dataset', lambda: fetcher.iter_kaggle_dataset(csv_path), args.rows)
+        timed('github legacy (json.load loop)', lambda: legacy_github_loader(json_path), args.rows)
+        timed('github load_github_dataset', lambda: fetcher.load_github_dataset(json_path), args.rows)
+        timed('github iter_github_dataset', lambda: fetcher.iter_github_dataset(json_path), args.rows)
+
+if __name__ == "__main__":
+    main()
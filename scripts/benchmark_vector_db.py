@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the medicine vector database
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import argparse
+import json
+import pickle
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import logging
+import numpy as np
+import faiss
+from comprehensive_drug_database import COMPREHENSIVE_DRUG_DATABASE
+from vector_db import MedicineVectorDB, build_faiss_index
+from chunk_store import MetadataStore
+from embeddings import SentenceTransformerBackend, OnnxEmbeddingBackend, export_onnx_model
+
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+def synthetic_documents(copies: int = 10):
+    """Build label-like documents from the bundled drug database"""
+    documents = []
+    for copy in range(copies):
+        for drug_name, info in COMPREHENSIVE_DRUG_DATABASE.items():
+            for section in ['uses', 'side_effects', 'dosage', 'warnings']:
+                documents.append({
+                    'drug_name': drug_name,
+                    'content': f"Drug: {drug_name} (copy {copy})\nSection: {section.title()}\n\n" + " ".join([info[section]] * 8),
+                    'source': 'Benchmark',
+                    'section': section
+                })
+    return documents
+
+def benchmark_ingest(args):
+    """Compare the legacy per-chunk ingestion loop against batched add_documents"""
+    documents = synthetic_documents(args.copies)
+
+    # Legacy path: one encode and one index.add per chunk
+    legacy_db = MedicineVectorDB()
+    legacy_db.create_index()
+    chunks, metadata = legacy_db._chunk_documents(documents)
+    start = time.perf_counter()
+    for chunk in chunks:
+        embedding = legacy_db.embedding_model.encode([chunk])[0]
+        legacy_db.index.add(np.array([embedding], dtype=np.float32))
+    legacy_elapsed = time.perf_counter() - start
+    legacy_throughput = len(chunks) / legacy_elapsed
+
+    # Batched path
+    batched_db = MedicineVectorDB(batch_size=args.batch_size)
+    stats = batched_db.add_documents(documents)
+
+    print(f"Chunks ingested:      {len(chunks)}")
+    print(f"Per-chunk loop:       {legacy_throughput:8.1f} chunks/sec ({legacy_elapsed:.2f}s)")
+    print(f"Batched (size {args.batch_size:>4}): {stats['chunks_per_sec']:8.1f} chunks/sec ({stats['seconds']:.2f}s)")
+    print(f"Speedup:              {stats['chunks_per_sec'] / legacy_throughput:8.2f}x")
+
+def synthetic_vectors(n: int, dimension: int = 384, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Clustered, unit-normalised vectors that roughly mimic sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + 0.5 * rng.normal(size=(n, dimension)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+def recall_at_k(ground_truth: np.ndarray, found: np.ndarray) -> float:
+    """Fraction of the exact top-k neighbours returned by the approximate search"""
+    hits = sum(len(set(truth) & set(result)) for truth, result in zip(ground_truth, found))
+    return hits / ground_truth.size
+
+def benchmark_ann(args):
+    """Recall@k and per-query latency of each ANN index type against the flat baseline"""
+    # Queries come from the same clusters as the corpus, as real user questions would
+    vectors = synthetic_vectors(args.vectors + args.queries)
+    vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+
+    flat, _, _ = build_faiss_index('flat', vectors.shape[1])
+    flat.add(vectors)
+    start = time.perf_counter()
+    _, ground_truth = flat.search(queries, args.k)
+    flat_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+    print(f"{args.vectors} vectors, {args.queries} queries, k={args.k}")
+    print(f"{'index':<10} {'param':<14} {'recall@k':>9} {'ms/query':>9} {'build s':>8}")
+    print(f"{'flat':<10} {'-':<14} {1.0:>9.3f} {flat_ms:>9.3f} {'-':>8}")
+
+    sweeps = {
+        'ivf_flat': ('nprobe', [1, 4, 16, 64]),
+        'ivf_pq': ('nprobe', [1, 4, 16, 64]),
+        'hnsw': ('efSearch', [16, 32, 64, 128]),
+    }
+    for index_type, (param, values) in sweeps.items():
+        start = time.perf_counter()
+        index, _, _ = build_faiss_index(index_type, vectors.shape[1], vectors[:args.train_size], nlist=args.nlist)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        for value in values:
+            faiss.ParameterSpace().set_index_parameter(index, param, value)
+            start = time.perf_counter()
+            _, found = index.search(queries, args.k)
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{index_type:<10} {param + '=' + str(value):<14} {recall_at_k(ground_truth, found):>9.3f} "
+                  f"{ms:>9.3f} {build_seconds:>8.2f}")
+
+def memory_usage_mb():
+    """Anonymous (private heap) and file-backed (shareable page cache) resident memory in MB"""
+    usage = {'anon': float('nan'), 'file': float('nan')}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('RssAnon:'):
+                usage['anon'] = int(line.split()[1]) / 1024
+            elif line.startswith('RssFile:'):
+                usage['file'] = int(line.split()[1]) / 1024
+    return usage
+
+def probe_load(args):
+    """Load a store in this (fresh) process and report startup cost as JSON"""
+    db = MedicineVectorDB()
+    before = memory_usage_mb()
+    start = time.perf_counter()
+    db.load(args.path, mmap=args.mmap)
+    seconds = time.perf_counter() - start
+
+    # Touch a handful of rows the way search results would
+    rng = np.random.default_rng(0)
+    for row in rng.integers(0, len(db.documents), 100):
+        db.documents[row]
+        db.metadata[row]
+    after = memory_usage_mb()
+
+    print(json.dumps({
+        'seconds': seconds,
+        'anon_mb': after['anon'] - before['anon'],
+        'file_mb': after['file'] - before['file']
+    }))
+
+def benchmark_load(args):
+    """Startup time and memory of the legacy pickle load vs the memory-mapped load.
+
+    Private memory is paid again by every uvicorn worker; shared memory is
+    file-backed and served once from the OS page cache for all of them.
+    """
+    workdir = tempfile.mkdtemp(prefix='vector_db_bench_')
+    path = os.path.join(workdir, 'vector_db')
+
+    db = MedicineVectorDB()
+    documents = synthetic_documents(1)
+    chunks, metadata = db._chunk_documents(documents)
+    repeats = args.chunks // len(chunks) + 1
+    # Distinct strings/dicts per row, as a real corpus would have (pickle would share repeats)
+    chunks = [f"{chunk} [{row}]" for row, chunk in enumerate((chunks * repeats)[:args.chunks])]
+    metadata = [dict(m) for m in (metadata * repeats)[:args.chunks]]
+    db._add_embeddings(synthetic_vectors(len(chunks)), chunks, metadata)
+
+    # Legacy format: FAISS index plus one pickle of every chunk and metadata dict
+    legacy_path = os.path.join(workdir, 'legacy')
+    faiss.write_index(db.index, f"{legacy_path}.index")
+    with open(f"{legacy_path}.pkl", 'wb') as f:
+        pickle.dump({'documents': list(db.documents), 'metadata': list(db.metadata)}, f)
+    db.save(path)
+
+    runs = [('pickle (legacy)', legacy_path, False), ('in-memory', path, False), ('mmap', path, True)]
+    print(f"{len(chunks)} chunks")
+    print(f"{'load mode':<16} {'seconds':>8} {'private MB':>11} {'shared MB':>10}")
+    for label, store_path, mmap in runs:
+        command = [sys.executable, __file__, 'load-probe', '--path', store_path]
+        if mmap:
+            command.append('--mmap')
+        result = json.loads(subprocess.check_output(command).decode().strip().splitlines()[-1])
+        print(f"{label:<16} {result['seconds']:>8.3f} {result['anon_mb']:>11.1f} {result['file_mb']:>10.1f}")
+
+def benchmark_metadata(args):
+    """Memory per chunk and /health stats cost: per-chunk dicts vs the columnar MetadataStore"""
+    documents = synthetic_documents(1)
+
+    def rows():
+        for row in range(args.chunks):
+            doc = documents[row % len(documents)]
+            yield {
+                'drug_name': doc['drug_name'],
+                'source': doc['source'],
+                'section': doc['section'],
+                'chunk_id': row % 7,
+                'total_chunks': 7
+            }
+
+    results = {}
+    for label, build in [('list of dicts', lambda: list(rows())), ('MetadataStore', lambda: MetadataStore.from_values(rows()))]:
+        tracemalloc.start()
+        store = build()
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        start = time.perf_counter()
+        if isinstance(store, list):
+            unique = len(set(m['drug_name'] for m in store))
+        else:
+            unique = store.unique_drugs
+        stats_ms = (time.perf_counter() - start) * 1000
+        results[label] = (size / args.chunks, stats_ms, unique)
+
+    print(f"{args.chunks} chunks")
+    print(f"{'representation':<16} {'bytes/chunk':>12} {'stats ms':>9} {'unique drugs':>13}")
+    for label, (per_chunk, stats_ms, unique) in results.items():
+        print(f"{label:<16} {per_chunk:>12.1f} {stats_ms:>9.3f} {unique:>13}")
+
+def benchmark_compression(args):
+    """Memory footprint, latency and top-k overlap of compressed indexes vs uncompressed IndexFlatL2"""
+    vectors = synthetic_vectors(args.vectors + args.queries)
+    vectors, queries = vectors[:args.vectors], vectors[args.vectors:]
+    train = vectors[:args.train_size]
+
+    configs = [
+        ('flat', 'none'), ('flat', 'fp16'), ('flat', 'sq8'), ('flat', 'pq'),
+        ('ivf_flat', 'sq8'), ('ivf_pq', 'pq'), ('hnsw', 'sq8')
+    ]
+    print(f"{args.vectors} vectors, {args.queries} queries, k={args.k}")
+    print(f"{'index':<10} {'compression':<12} {'MB':>8} {'bytes/vec':>10} {'ms/query':>9} {'top-k overlap':>14}")
+
+    ground_truth = None
+    for index_type, compression in configs:
+        # Report the codec actually built: PQ falls back to SQ8 on too few training vectors
+        index, index_type, compression = build_faiss_index(
+            index_type, vectors.shape[1], train, nlist=args.nlist, compression=compression
+        )
+        index.add(vectors)
+        if index_type.startswith('ivf'):
+            faiss.ParameterSpace().set_index_parameter(index, 'nprobe', args.nprobe)
+
+        size = len(faiss.serialize_index(index))
+        start = time.perf_counter()
+        _, found = index.search(queries, args.k)
+        ms = (time.perf_counter() - start) * 1000 / len(queries)
+        if ground_truth is None:
+            ground_truth = found
+        print(f"{index_type:<10} {compression:<12} {size / 2**20:>8.1f} {size / args.vectors:>10.1f} "
+              f"{ms:>9.3f} {recall_at_k(ground_truth, found):>14.3f}")
+
+def benchmark_embeddings(args):
+    """Load time, single-query latency, batch throughput and cosine agreement of embedding backends"""
+    texts = [doc['content'] for doc in synthetic_documents(1)][:args.texts]
+    if not os.path.exists(os.path.join(args.onnx_dir, 'model_int8.onnx')):
+        export_onnx_model(output_dir=args.onnx_dir)
+
+    backends = [
+        ('sentence-transformers', SentenceTransformerBackend(num_threads=args.threads)),
+        ('onnx fp32', OnnxEmbeddingBackend(args.onnx_dir, quantized=False, num_threads=args.threads)),
+        ('onnx int8', OnnxEmbeddingBackend(args.onnx_dir, quantized=True, num_threads=args.threads))
+    ]
+    print(f"{len(texts)} texts, batch size {args.batch_size}, threads {args.threads or 'default'}")
+    print(f"{'backend':<22} {'load s':>7} {'ms/query':>9} {'texts/sec':>10} {'cosine vs st':>13}")
+
+    reference = None
+    for label, backend in backends:
+        start = time.perf_counter()
+        backend.encode(["warm up"])
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for text in texts[:args.queries]:
+            backend.encode([text[:200]])
+        query_ms = (time.perf_counter() - start) * 1000 / min(args.queries, len(texts))
+
+        start = time.perf_counter()
+        embeddings = backend.encode(texts, batch_size=args.batch_size)
+        throughput = len(texts) / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = embeddings
+        cosine = float(np.mean(np.sum(reference * embeddings, axis=1)))
+        print(f"{label:<22} {load_seconds:>7.2f} {query_ms:>9.2f} {throughput:>10.1f} {cosine:>13.4f}")
+
+def benchmark_retrieval(args):
+    """Latency of vector, lexical and hybrid search for drug-name and natural-language queries"""
+    db = MedicineVectorDB()
+    db.add_documents(synthetic_documents(args.copies))
+    drugs = list(COMPREHENSIVE_DRUG_DATABASE)[:args.queries]
+    query_sets = {
+        'drug names': drugs,
+        'questions': [f"what are the side effects of taking {drug} daily" for drug in drugs]
+    }
+
+    print(f"{db.get_stats()['total_documents']} chunks, {len(drugs)} queries per set, k={args.k}")
+    print(f"{'queries':<12} {'mode':<8} {'ms/query':>9} {'model calls':>12}")
+    for label, queries in query_sets.items():
+        for mode in ('vector', 'lexical', 'hybrid'):
+            db.embedding_cache.clear()
+            db.result_cache.clear()
+            misses = db.embedding_cache.misses
+            start = time.perf_counter()
+            for query in queries:
+                db.search(query, args.k, mode=mode)
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            print(f"{label:<12} {mode:<8} {ms:>9.2f} {db.embedding_cache.misses - misses:>12}")
+
+def benchmark_reingest(args):
+    """Cold vs warm ingestion through the persistent chunk embedding cache"""
+    documents = synthetic_documents(args.copies)
+    # Every label section twice: duplicates within a run are embedded once
+    documents = documents + [dict(doc, source='Benchmark copy') for doc in documents]
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, 'embeddings.sqlite')
+        print(f"{'run':<6} {'chunks':>7} {'embedded':>9} {'seconds':>8} {'chunks/sec':>11}")
+        for run in ('cold', 'warm'):
+            db = MedicineVectorDB(batch_size=args.batch_size, embedding_cache_path=cache_path)
+            stats = db.add_documents(documents)
+            db.chunk_cache.close()
+            print(f"{run:<6} {stats['chunks']:>7} {stats['embedded_chunks']:>9} "
+                  f"{stats['seconds']:>8.2f} {stats['chunks_per_sec']:>11.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    ingest = subparsers.add_parser('ingest', help='Per-chunk vs batched ingestion throughput')
+    ingest.add_argument('--copies', type=int, default=10, help='Copies of the bundled drug database to ingest')
+    ingest.add_argument('--batch-size', type=int, default=64)
+    ingest.set_defaults(func=benchmark_ingest)
+
+    ann = subparsers.add_parser('ann', help='Recall vs latency of ANN index types against flat')
+    ann.add_argument('--vectors', type=int, default=100000)
+    ann.add_argument('--queries', type=int, default=500)
+    ann.add_argument('--k', type=int, default=10)
+    ann.add_argument('--nlist', type=int, default=1024)
+    ann.add_argument('--train-size', type=int, default=50000)
+    ann.set_defaults(func=benchmark_ann)
+
+    load = subparsers.add_parser('load', help='Startup time and RSS of pickle vs memory-mapped loading')
+    load.add_argument('--chunks', type=int, default=200000)
+    load.set_defaults(func=benchmark_load)
+
+    probe = subparsers.add_parser('load-probe', help=argparse.SUPPRESS)
+    probe.add_argument('--path', required=True)
+    probe.add_argument('--mmap', action='store_true')
+    probe.set_defaults(func=probe_load)
+
+    metadata = subparsers.add_parser('metadata', help='Metadata memory per chunk and stats cost')
+    metadata.add_argument('--chunks', type=int, default=500000)
+    metadata.set_defaults(func=benchmark_metadata)
+
+    compression = subparsers.add_parser('compression', help='Memory, latency and overlap of compressed indexes')
+    compression.add_argument('--vectors', type=int, default=100000)
+    compression.add_argument('--queries', type=int, default=500)
+    compression.add_argument('--k', type=int, default=10)
+    compression.add_argument('--nlist', type=int, default=1024)
+    compression.add_argument('--nprobe', type=int, default=32)
+    compression.add_argument('--train-size', type=int, default=50000)
+    compression.set_defaults(func=benchmark_compression)
+
+    embeddings = subparsers.add_parser('embeddings', help='Latency and throughput of sentence-transformers vs ONNX Runtime')
+    embeddings.add_argument('--texts', type=int, default=512)
+    embeddings.add_argument('--queries', type=int, default=100)
+    embeddings.add_argument('--batch-size', type=int, default=64)
+    embeddings.add_argument('--threads', type=int, default=None, help='Intra-op threads per backend')
+    embeddings.add_argument('--onnx-dir', default='./data/onnx/all-MiniLM-L6-v2')
+    embeddings.set_defaults(func=benchmark_embeddings)
+
+    retrieval = subparsers.add_parser('retrieval', help='Vector vs lexical vs hybrid search latency')
+    retrieval.add_argument('--copies', type=int, default=5)
+    retrieval.add_argument('--queries', type=int, default=50)
+    retrieval.add_argument('--k', type=int, default=5)
+    retrieval.set_defaults(func=benchmark_retrieval)
+
+    reingest = subparsers.add_parser('reingest', help='Cold vs warm ingestion with the chunk embedding cache')
+    reingest.add_argument('--copies', type=int, default=10)
+    reingest.add_argument('--batch-size', type=int, default=64)
+    reingest.set_defaults(func=benchmark_reingest)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
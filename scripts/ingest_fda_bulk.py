@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Stream openFDA bulk drug label downloads (drug-label-*.json.zip) into the vector database.
+
+Each label is stored under its set_id and the indexed version of every
+set_id is recorded next to the database, so re-running over the same or a
+newer download only re-embeds labels with a newer version and replaces them.
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import argparse
+import itertools
+import json
+import logging
+from vector_db import MedicineVectorDB
+from data_fetcher import FDADataFetcher
+from streaming_ingest import StreamingIngestor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('zips', nargs='+', help='openFDA drug label zip files from https://open.fda.gov/data/downloads/')
+    parser.add_argument('--output', default="../data/vector_db", help='Vector database path (extended if it exists)')
+    parser.add_argument('--batch-size', type=int, default=256, help='Documents per pipeline batch')
+    parser.add_argument('--queue-size', type=int, default=4, help='Batches buffered between pipeline stages')
+    args = parser.parse_args()
+
+    db = MedicineVectorDB(embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", f"{args.output}.embeddings.sqlite"))
+    versions_path = f"{args.output}.bulk_labels.json"
+    versions = {}
+    if os.path.exists(f"{args.output}.index"):
+        db.load(args.output)
+        if os.path.exists(versions_path):
+            with open(versions_path, 'r', encoding='utf-8') as f:
+                versions = json.load(f)
+
+    fetcher = FDADataFetcher()
+    labels = itertools.chain.from_iterable(fetcher.iter_bulk_labels(path, known_versions=versions) for path in args.zips)
+    stats = StreamingIngestor(db, batch_size=args.batch_size, queue_size=args.queue_size).ingest(
+        labels, fetcher.create_document_for_vectordb, replace=True
+    )
+
+    db.save(args.output)
+    # Recorded only once the labels are saved, so an interrupted run is redone rather than skipped
+    tmp_path = f"{versions_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(versions, f)
+    os.replace(tmp_path, versions_path)
+    logger.info(f"Ingest: {stats}")
+    logger.info(f"Statistics: {db.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Stream a local Indian medicine dump (Kaggle CSV or GitHub JSON) into the vector database
+"""
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import argparse
+import logging
+from vector_db import MedicineVectorDB
+from indian_data_fetcher import IndianMedicineDataFetcher
+from streaming_ingest import StreamingIngestor
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--kaggle', help='Kaggle Indian medicine CSV')
+    parser.add_argument('--github', help='GitHub Indian medicine JSON array')
+    parser.add_argument('--output', default="../data/vector_db", help='Vector database path (extended if it exists)')
+    parser.add_argument('--batch-size', type=int, default=256, help='Documents per pipeline batch')
+    parser.add_argument('--queue-size', type=int, default=4, help='Batches buffered between pipeline stages')
+    args = parser.parse_args()
+    if not args.kaggle and not args.github:
+        parser.error("give --kaggle and/or --github")
+
+    db = MedicineVectorDB(embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", f"{args.output}.embeddings.sqlite"))
+    if os.path.exists(f"{args.output}.index"):
+        db.load(args.output)
+
+    fetcher = IndianMedicineDataFetcher()
+    ingestor = StreamingIngestor(db, batch_size=args.batch_size, queue_size=args.queue_size)
+    if args.kaggle:
+        ingestor.ingest(fetcher.iter_kaggle_dataset(args.kaggle), fetcher.create_documents_for_vectordb)
+    if args.github:
+        ingestor.ingest(fetcher.iter_github_dataset(args.github), fetcher.create_documents_for_vectordb)
+
+    db.save(args.output)
+    logger.info(f"Statistics: {db.get_stats()}")
+
+if __name__ == "__main__":
+    main()
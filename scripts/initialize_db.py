@@ -6,18 +6,64 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 
-from rag_pipeline import MedicineRAGPipeline
+import argparse
+import json
 import logging
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+def fda_documents():
+    """Vector database documents for the common drugs, fetched from openFDA"""
+    from data_fetcher import FDADataFetcher
+    
+    fetcher = FDADataFetcher()
+    for drug_data in fetcher.fetch_common_drugs_data():
+        yield from fetcher.create_document_for_vectordb(drug_data)
+        
+def file_documents(path: str):
+    """Documents from a JSON Lines file, one document dict per line"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+                
+def build_offline(args):
+    """Build the database with a sharded multi-process pipeline"""
+    from index_builder import ParallelIndexBuilder
+    
+    builder = ParallelIndexBuilder(
+        args.output,
+        workers=args.workers,
+        shard_size=args.shard_size,
+        embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", f"{args.output}.embeddings.sqlite")
+    )
+    documents = file_documents(args.documents) if args.documents else fda_documents()
+    stats = builder.build(documents, resume=not args.no_resume)
+    logger.info(f"Database built successfully!")
+    logger.info(f"Statistics: {stats}")
+    
 def main():
     """Initialize the vector database"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--output', default="../data/vector_db", help='Vector database path')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Build offline with this many chunking/embedding processes')
+    parser.add_argument('--shard-size', type=int, default=256, help='Documents per worker shard')
+    parser.add_argument('--documents', help='JSON Lines file of documents to index instead of fetching from openFDA')
+    parser.add_argument('--no-resume', action='store_true', help='Ignore checkpoints from an interrupted build')
+    args = parser.parse_args()
+    
+    if args.workers or args.documents:
+        build_offline(args)
+        return
+        
+    from rag_pipeline import MedicineRAGPipeline
+    
     logger.info("Starting database initialization...")
     
     # Create pipeline
-    pipeline = MedicineRAGPipeline(vector_db_path="../data/vector_db")
+    pipeline = MedicineRAGPipeline(vector_db_path=args.output)
     
     # Initialize database
     pipeline.initialize_database()